@@ -33,3 +33,19 @@ class User(AbstractBaseUser, PermissionsMixin):
     
     def __str__(self):
         return self.email
+
+
+class CaregiverLink(models.Model):
+    """
+    Lets a caregiver (nurse, family member) see a patient's dispensers
+    without logging in as the patient. Created by the patient.
+    """
+    caregiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name="patient_links")
+    patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name="caregiver_links")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ("caregiver", "patient")
+
+    def __str__(self):
+        return f"{self.caregiver} cares for {self.patient}"
@@ -80,3 +80,19 @@ class LoginSerializer(serializers.Serializer):
             raise serializers.ValidationError('Incorrect email or password.')
         data['user'] = user
         return data
+
+
+class AddCaregiverSerializer(serializers.Serializer):
+    email = serializers.EmailField()
+
+    def validate_email(self, value):
+        try:
+            caregiver = User.objects.get(email=value)
+        except User.DoesNotExist:
+            raise serializers.ValidationError("No user with this email exists.")
+
+        request = self.context.get('request')
+        if request and request.user == caregiver:
+            raise serializers.ValidationError("You cannot be your own caregiver.")
+        self.caregiver = caregiver
+        return value
@@ -1,3 +1,128 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .models import CaregiverLink, User
+from .throttling import take_token
+
+ROOMY_RATES = {'login_ip': (1000, 60), 'login_account': (1000, 60), 'register_ip': (1000, 60)}
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+REDIS_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = reverse('login')
+        User.objects.create_user(email='alice@example.com', username='alice', phoneNumber='5551234', password='right-password')
+
+    def login(self, email='alice@example.com', **extra):
+        return self.client.post(self.url, {'email': email, 'password': 'wrong-password'}, format='json', **extra)
+
+    def test_account_bucket_returns_429_with_retry_after(self):
+        with override_settings(AUTH_THROTTLE_RATES={**ROOMY_RATES, 'login_account': (2, 300)}):
+            self.assertEqual(self.login().status_code, 400)
+            self.assertEqual(self.login(email=' Alice@Example.com').status_code, 400)
+            response = self.login()
+
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    def test_other_accounts_keep_their_own_bucket(self):
+        with override_settings(AUTH_THROTTLE_RATES={**ROOMY_RATES, 'login_account': (1, 300)}):
+            self.login()
+            self.assertEqual(self.login().status_code, 429)
+            self.assertEqual(self.login(email='bob@example.com').status_code, 400)
+
+    def test_forwarded_for_header_does_not_pick_the_ip_bucket(self):
+        with override_settings(AUTH_THROTTLE_RATES={**ROOMY_RATES, 'login_ip': (2, 60)}):
+            statuses = [
+                self.login(email=f'user{attempt}@example.com', HTTP_X_FORWARDED_FOR=f'10.0.0.{attempt}').status_code
+                for attempt in range(3)
+            ]
+
+        self.assertEqual(statuses, [400, 400, 429])
+
+    def test_register_is_throttled_per_ip(self):
+        with override_settings(AUTH_THROTTLE_RATES={**ROOMY_RATES, 'register_ip': (1, 3600)}):
+            self.client.post(reverse('register'), {}, format='json')
+            response = self.client.post(reverse('register'), {}, format='json')
+
+        self.assertEqual(response.status_code, 429)
+
+
+class TakeTokenTests(TestCase):
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_bucket_refills_over_period(self):
+        cache.clear()
+        with mock.patch('authentication.throttling.time.monotonic', return_value=1000.0):
+            self.assertTrue(take_token('bucket', 1, 10)[0])
+            allowed, wait = take_token('bucket', 1, 10)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 10)
+
+        with mock.patch('authentication.throttling.time.monotonic', return_value=1010.0):
+            self.assertTrue(take_token('bucket', 1, 10)[0])
+
+    @override_settings(CACHES=REDIS_CACHE)
+    def test_redis_cache_uses_the_atomic_script(self):
+        with mock.patch('authentication.throttling._take_token_redis', return_value=(True, 4.0)) as redis_take, \
+                mock.patch('authentication.throttling._take_token_local') as local_take:
+            self.assertEqual(take_token('bucket', 5, 60), (True, 0))
+
+        redis_take.assert_called_once()
+        local_take.assert_not_called()
+
+
+class CaregiverTests(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(email='alice@example.com', username='alice', phoneNumber='5551234')
+        self.caregiver = User.objects.create_user(email='bob@example.com', username='bob', phoneNumber='5555678')
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+
+    def add(self, email):
+        return self.client.post(reverse('caregivers'), {'email': email}, format='json')
+
+    def test_add_and_list_caregiver(self):
+        response = self.add('bob@example.com')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['id'], self.caregiver.pk)
+        # Adding twice keeps one link
+        self.assertEqual(self.add('bob@example.com').status_code, 201)
+
+        listed = self.client.get(reverse('caregivers')).data
+        self.assertEqual([caregiver['username'] for caregiver in listed], ['bob'])
+        self.assertEqual(CaregiverLink.objects.count(), 1)
+
+    def test_cannot_be_own_caregiver(self):
+        response = self.add('alice@example.com')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['detail'], "You cannot be your own caregiver.")
+        self.assertFalse(CaregiverLink.objects.exists())
+
+    def test_unknown_email_is_rejected(self):
+        self.assertEqual(self.add('nobody@example.com').status_code, 400)
+
+    def test_remove_caregiver(self):
+        self.add('bob@example.com')
+        url = reverse('remove_caregiver', args=[self.caregiver.pk])
+
+        self.assertEqual(self.client.delete(url).status_code, 200)
+        self.assertFalse(CaregiverLink.objects.exists())
+        self.assertEqual(self.client.delete(url).status_code, 404)
+
+    def test_cannot_remove_someone_elses_link(self):
+        other = User.objects.create_user(email='carol@example.com', username='carol', phoneNumber='5550000')
+        CaregiverLink.objects.create(caregiver=self.caregiver, patient=other)
+
+        response = self.client.delete(reverse('remove_caregiver', args=[self.caregiver.pk]))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(CaregiverLink.objects.exists())
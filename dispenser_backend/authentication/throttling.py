@@ -0,0 +1,120 @@
+"""
+Token bucket throttles for the credential endpoints.
+
+DRF runs throttles before the view, so a rejected login never reaches
+the password hasher or the user table. Buckets live in the default
+cache: with Redis every take is a single Lua script, atomic across all
+workers; with the local memory cache a lock makes it atomic within the
+process, which is all that cache is shared by anyway.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.throttling import BaseThrottle
+
+# KEYS[1] bucket hash; ARGV capacity, refill rate (tokens/s), ttl (s)
+TAKE_TOKEN_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return {allowed, tostring(tokens)}
+"""
+
+_local_lock = threading.Lock()
+
+
+def _take_token_redis(cache, key, capacity, rate, ttl):
+    client = cache._cache.get_client(key, write=True)
+    allowed, tokens = client.eval(TAKE_TOKEN_SCRIPT, 1, key, capacity, rate, ttl)
+    return bool(allowed), float(tokens)
+
+
+def _take_token_local(cache, key, capacity, rate, ttl):
+    with _local_lock:
+        now = time.monotonic()
+        tokens, ts = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        cache.set(key, (tokens, now), ttl)
+    return allowed, tokens
+
+
+def take_token(key, capacity, period):
+    """
+    Take one token from the bucket at key, which holds up to capacity
+    tokens and refills completely over period seconds.
+    Returns (allowed, seconds until the next token).
+    """
+    rate = capacity / period
+    ttl = int(period) + 1
+    # The backend itself; django.core.cache.cache is a proxy of it
+    cache = caches['default']
+    if isinstance(cache, RedisCache):
+        allowed, tokens = _take_token_redis(cache, cache.make_and_validate_key(key), capacity, rate, ttl)
+    else:
+        allowed, tokens = _take_token_local(cache, key, capacity, rate, ttl)
+    return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Subclasses set scope, which names a (capacity, period in seconds)
+    entry in settings.AUTH_THROTTLE_RATES, and build the bucket key.
+    """
+    scope = None
+
+    def get_bucket_id(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        bucket_id = self.get_bucket_id(request, view)
+        if bucket_id is None:
+            return True
+
+        capacity, period = settings.AUTH_THROTTLE_RATES[self.scope]
+        allowed, self.wait_seconds = take_token(f"throttle:{self.scope}:{bucket_id}", capacity, period)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPThrottle(TokenBucketThrottle):
+    def get_bucket_id(self, request, view):
+        return self.get_ident(request)
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = 'login_ip'
+
+
+class RegisterIPThrottle(IPThrottle):
+    scope = 'register_ip'
+
+
+class LoginAccountThrottle(TokenBucketThrottle):
+    """Per target account, so a botnet spread over many IPs is still slowed down"""
+    scope = 'login_account'
+
+    def get_bucket_id(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str) or not email:
+            return None
+        return email.strip().lower()
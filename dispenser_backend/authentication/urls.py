@@ -6,7 +6,9 @@ from .views import (
     LoginView, 
     LogoutView,
     GetUserView,
-    RefreshAccessTokenView
+    RefreshAccessTokenView,
+    CaregiversView,
+    RemoveCaregiverView
     )
 
 urlpatterns = [
@@ -15,5 +17,7 @@ urlpatterns = [
     path('logout/', LogoutView.as_view(), name='logout'),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', RefreshAccessTokenView.as_view(), name='token_refresh'),
-    path('user/', GetUserView.as_view(), name='get_user')
+    path('user/', GetUserView.as_view(), name='get_user'),
+    path('caregivers/', CaregiversView.as_view(), name='caregivers'),
+    path('caregivers/<int:caregiver_id>/', RemoveCaregiverView.as_view(), name='remove_caregiver')
 ]
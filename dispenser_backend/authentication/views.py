@@ -1,4 +1,4 @@
-from .serializers import RegisterSerializer, LoginSerializer, UserSerializer
+from .serializers import RegisterSerializer, LoginSerializer, UserSerializer, AddCaregiverSerializer
 from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.views import TokenRefreshView
@@ -7,9 +7,12 @@ from rest_framework.response import Response
 from rest_framework.views import APIView    
 from rest_framework import status, views, permissions
 from datetime import datetime
-from .models import User
+from .models import User, CaregiverLink
+from .throttling import LoginIPThrottle, LoginAccountThrottle, RegisterIPThrottle
 
 class RegisterView(APIView):
+    throttle_classes = [RegisterIPThrottle]
+
     def post(self, request):
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
@@ -26,6 +29,9 @@ class RegisterView(APIView):
         return Response({"detail": errorMessages}, status=status.HTTP_400_BAD_REQUEST)
 
 class LoginView(views.APIView):
+    # Checked before the serializer, so rejected attempts never hash a password
+    throttle_classes = [LoginIPThrottle, LoginAccountThrottle]
+
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
@@ -76,3 +82,34 @@ class GetUserView(APIView):
 class RefreshAccessTokenView(TokenRefreshView):
     serializer_class = TokenRefreshSerializer
 
+class CaregiversView(APIView):
+    """The caregivers allowed to see the current user's dispensers"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        caregivers = User.objects.filter(patient_links__patient=request.user)
+        return Response([
+            {'id': caregiver.id, **UserSerializer(caregiver).data}
+            for caregiver in caregivers
+        ], status=status.HTTP_200_OK)
+
+    def post(self, request):
+        serializer = AddCaregiverSerializer(data=request.data, context={'request': request})
+        if serializer.is_valid():
+            CaregiverLink.objects.get_or_create(caregiver=serializer.caregiver, patient=request.user)
+            return Response({
+                'id': serializer.caregiver.id,
+                **UserSerializer(serializer.caregiver).data
+            }, status=status.HTTP_201_CREATED)
+
+        errorMessages = " ".join([" ".join(messages) for messages in serializer.errors.values()])
+        return Response({"detail": errorMessages}, status=status.HTTP_400_BAD_REQUEST)
+
+class RemoveCaregiverView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def delete(self, request, caregiver_id):
+        deleted, _ = CaregiverLink.objects.filter(caregiver_id=caregiver_id, patient=request.user).delete()
+        if not deleted:
+            return Response({"detail": "Caregiver not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"detail": "Caregiver removed."}, status=status.HTTP_200_OK)
@@ -0,0 +1,138 @@
+"""
+Missed dose detection and SMS alerting.
+
+A sweep looks at one window of dose times that ended MISSED_DOSE_GRACE
+ago. A dose in that window is missed when its container has not
+dispensed since the window started. All overdue doses of all users are
+found with a single query, coalesced into one message per user and
+handed to the SMS gateway in batches. Each batch is claimed by inserting
+its MissedDoseAlert rows before sending, and only the users this sweep
+actually inserted are texted, so overlapping sweeps never double-send.
+"""
+from datetime import datetime, time, timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import MissedDoseAlert, Schedule
+from .sms import SMSMessage, get_gateway
+
+# Doses listed by name in one SMS before it switches to "and N more"
+MAX_DOSES_PER_MESSAGE = 5
+
+
+def sweep_window(now=None):
+    """The most recent complete [start, end) window of dose times to check"""
+    now = timezone.localtime(now)
+    window = settings.MISSED_DOSE_WINDOW.total_seconds()
+    latest = (now - settings.MISSED_DOSE_GRACE).timestamp()
+    end = datetime.fromtimestamp(latest - latest % window, tz=now.tzinfo)
+    return end - settings.MISSED_DOSE_WINDOW, end
+
+
+def _dose_times_between(start, end):
+    """Schedule filter for weekday/time pairs in [start, end), split at midnight"""
+    condition = Q()
+    day_start = start
+    while day_start < end:
+        midnight = datetime.combine(day_start.date() + timedelta(days=1), time(0), tzinfo=day_start.tzinfo)
+        day_end = min(end, midnight)
+        on_day = Q(weekday=day_start.weekday(), time__gte=day_start.time())
+        if day_end < midnight:
+            on_day &= Q(time__lt=day_end.time())
+        condition |= on_day
+        day_start = day_end
+    return condition
+
+
+def overdue_doses(start, end):
+    """
+    One row per missed dose, ordered by user. Only users with a phone
+    number are included.
+    """
+    return Schedule.objects.filter(
+        _dose_times_between(start, end),
+        Q(container__last_dispensed_at__isnull=True) | Q(container__last_dispensed_at__lt=start),
+        container__dispenser__deleted_at__isnull=True,
+        container__dispenser__owner__phoneNumber__isnull=False,
+    ).exclude(
+        container__dispenser__owner__phoneNumber=''
+    ).order_by(
+        'container__dispenser__owner_id', 'time', 'container__dispenser__name', 'container__slot_number'
+    ).values_list(
+        'container__dispenser__owner_id',
+        'container__dispenser__owner__phoneNumber',
+        'container__dispenser__name',
+        'container__pill_name',
+        'time',
+    )
+
+
+def _message_body(doses):
+    listed = [
+        f"{pill_name} ({dispenser_name}) at {dose_time.strftime('%H:%M')}"
+        for dispenser_name, pill_name, dose_time in doses[:MAX_DOSES_PER_MESSAGE]
+    ]
+    body = "Missed doses: " + "; ".join(listed)
+    if len(doses) > MAX_DOSES_PER_MESSAGE:
+        body += f"; and {len(doses) - MAX_DOSES_PER_MESSAGE} more"
+    return body
+
+
+def _claim(window_start, batch):
+    """
+    Insert an alert row for every (user_id, dose_count, message) in batch,
+    returns the user ids whose row this call created
+    """
+    table = connection.ops.quote_name(MissedDoseAlert._meta.db_table)
+    sent_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    window_start = connection.ops.adapt_datetimefield_value(window_start)
+    params = []
+    for user_id, dose_count, _ in batch:
+        params += [user_id, window_start, dose_count, sent_at]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (user_id, window_start, dose_count, sent_at) "
+            f"VALUES {', '.join(['(%s, %s, %s, %s)'] * len(batch))} "
+            f"ON CONFLICT (user_id, window_start) DO NOTHING RETURNING user_id",
+            params,
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def send_missed_dose_alerts(now=None, gateway=None):
+    """Run one sweep, returns the number of users alerted"""
+    start, end = sweep_window(now)
+    gateway = gateway or get_gateway()
+
+    already_alerted = set(
+        MissedDoseAlert.objects.filter(window_start=start).values_list('user_id', flat=True)
+    )
+
+    pending = []
+    for (user_id, phone_number), rows in groupby(overdue_doses(start, end).iterator(), key=lambda row: row[:2]):
+        if user_id in already_alerted:
+            continue
+        doses = [row[2:] for row in rows]
+        pending.append((user_id, len(doses), SMSMessage(phone_number, _message_body(doses))))
+
+    alerted = 0
+    batch_size = settings.SMS_BATCH_SIZE
+    for offset in range(0, len(pending), batch_size):
+        batch = pending[offset:offset + batch_size]
+        claimed = _claim(start, batch)
+        if not claimed:
+            continue
+        try:
+            gateway.send_batch([message for user_id, _, message in batch if user_id in claimed])
+        except Exception:
+            # Hand the batch back so the next sweep retries it
+            MissedDoseAlert.objects.filter(window_start=start, user_id__in=claimed).delete()
+            raise
+        alerted += len(claimed)
+
+    return alerted
@@ -0,0 +1,88 @@
+"""
+Audit trail of slot changes.
+
+Views describe each change with record_change() while their transaction
+is open. Entries collect in a buffer that lives for that one transaction
+and are written with one bulk INSERT right after it commits, still in
+the request thread. The INSERT thus runs outside the locked transaction
+and a rolled back change leaves no trace, but the request still waits
+for it; nothing is batched across requests.
+
+The change is committed by the time its entries are written, so a failed
+INSERT is logged and the change stands without its entries rather than
+turning a saved write into an error response.
+"""
+import logging
+import threading
+
+from django.db import transaction
+
+from .models import ScheduleAuditEntry
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def container_state(container, schedules):
+    """The audited view of a slot: its pill and its (weekday, time) pairs"""
+    return {
+        "pill_name": container.pill_name,
+        "schedules": sorted(
+            [schedule.weekday, schedule.time.strftime("%H:%M:%S")] for schedule in schedules
+        ),
+    }
+
+
+class _Buffer:
+    def __init__(self):
+        self.entries = []
+
+    def flush(self):
+        if getattr(_local, 'buffer', None) is self:
+            _local.buffer = None
+        try:
+            ScheduleAuditEntry.objects.bulk_create(self.entries, batch_size=500)
+        except Exception:
+            logger.exception("Could not write %d audit entries", len(self.entries))
+
+
+def _pending_buffer(connection):
+    """The buffer waiting on the current transaction's commit, if any"""
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None:
+        return None
+    # A rollback discards the flush callback, and the buffer with it
+    if any(func == buffer.flush for _, func, _ in connection.run_on_commit):
+        return buffer
+    return None
+
+
+def record_change(container, actor, action, before, after):
+    """
+    Queue an audit entry for container; before and after come from
+    container_state(). Unchanged states are not recorded.
+    """
+    if before == after:
+        return
+
+    entry = ScheduleAuditEntry(
+        container_id=container.pk,
+        dispenser_id=container.dispenser_id,
+        slot_number=container.slot_number,
+        actor_id=actor.pk,
+        action=action,
+        before=before,
+        after=after,
+    )
+
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        ScheduleAuditEntry.objects.bulk_create([entry])
+        return
+
+    buffer = _pending_buffer(connection)
+    if buffer is None:
+        buffer = _local.buffer = _Buffer()
+        transaction.on_commit(buffer.flush)
+    buffer.entries.append(entry)
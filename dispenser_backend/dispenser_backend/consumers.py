@@ -0,0 +1,82 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.core import signing
+
+from .models import Dispenser
+
+DEVICE_TOKEN_SALT = "dispenser_backend.device-socket"
+
+# Number of device sockets currently open in this process.
+_open_connections = 0
+
+
+def open_connection_count():
+    return _open_connections
+
+
+def dispenser_group_name(serial_id):
+    """Channel layer group a dispenser's socket listens on"""
+    return f"dispenser.{serial_id}"
+
+
+def device_token(dispenser):
+    """
+    Secret the owner's app provisions onto the device. It names the
+    dispenser row, so it stops working once the dispenser is deleted, even
+    if the serial is registered again.
+    """
+    return signing.dumps(dispenser.pk, salt=DEVICE_TOKEN_SALT)
+
+
+def dispenser_id_from_device_token(token):
+    """Returns None for tampered or malformed tokens"""
+    try:
+        return signing.loads(token, salt=DEVICE_TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+
+
+class DispenserConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Push channel for a physical dispenser.
+    The device connects to ws/dispensers/<serial_id>/?token=<device token>
+    and receives a "schedule.update" message whenever one of its containers
+    is edited. Serials are guessable, so the token is what authenticates it.
+    """
+
+    async def connect(self):
+        self.serial_id = self.scope["url_route"]["kwargs"]["serial_id"]
+        self.group_name = None
+
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        dispenser_id = dispenser_id_from_device_token(query.get("token", [""])[0])
+        if dispenser_id is None or not await self.dispenser_exists(dispenser_id):
+            await self.close(code=4403)
+            return
+
+        global _open_connections
+        self.group_name = dispenser_group_name(self.serial_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        _open_connections += 1
+
+    async def disconnect(self, code):
+        if self.group_name is None:
+            return
+
+        global _open_connections
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        _open_connections -= 1
+
+    async def schedule_update(self, event):
+        await self.send_json({
+            "type": "schedule.update",
+            "container": event["container"],
+            "sent_at": event["sent_at"],
+        })
+
+    @database_sync_to_async
+    def dispenser_exists(self, dispenser_id):
+        return Dispenser.objects.filter(pk=dispenser_id, serial_id=self.serial_id).exists()
@@ -0,0 +1,121 @@
+"""
+Fleet-wide dose load per minute of the week.
+
+Every schedule row maps to one cell of a 7x1440 (weekday x minute of day)
+occupancy matrix. Rows are pulled from the database as plain integers in a
+single pass and all counting happens in NumPy.
+"""
+from itertools import chain
+
+import numpy as np
+from django.db.models.functions import ExtractHour, ExtractMinute
+
+from .models import Schedule
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+# Upper edges of the "how busy is a minute" histogram buckets
+LOAD_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+
+def load_schedule_arrays(dispenser_id=None):
+    """
+    Returns (dispenser_ids, minute_of_week) as two int64 arrays, one entry
+    per schedule row, optionally of one dispenser only. The minute is
+    computed in SQL so no datetime.time objects are ever built.
+    """
+    rows = Schedule.objects.filter(
+        container__dispenser__deleted_at__isnull=True
+    )
+    if dispenser_id is not None:
+        rows = rows.filter(container__dispenser_id=dispenser_id)
+    rows = rows.order_by().annotate(
+        minute=ExtractHour('time') * 60 + ExtractMinute('time')
+    ).values_list('container__dispenser', 'weekday', 'minute')
+
+    flat = np.fromiter(
+        chain.from_iterable(rows.iterator(chunk_size=10000)),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    dispenser_ids = flat[:, 0]
+    minute_of_week = flat[:, 1] * MINUTES_PER_DAY + flat[:, 2]
+    return dispenser_ids, minute_of_week
+
+
+def dispenser_occupancy(dispenser_ids, minute_of_week, dispenser_id):
+    """7x1440 matrix of doses per minute for a single dispenser"""
+    minutes = minute_of_week[dispenser_ids == dispenser_id]
+    return np.bincount(minutes, minlength=MINUTES_PER_WEEK).reshape(7, MINUTES_PER_DAY)
+
+
+def fleet_occupancy(dispenser_ids, minute_of_week):
+    """
+    Sum of every dispenser's occupancy matrix.
+    Returns (doses, dispensers): doses due in each minute, and how many
+    distinct dispensers have at least one of them.
+    """
+    doses = np.bincount(minute_of_week, minlength=MINUTES_PER_WEEK)
+
+    # Collapse each dispenser's matrix to 0/1 before summing
+    cells = np.unique(dispenser_ids * MINUTES_PER_WEEK + minute_of_week)
+    dispensers = np.bincount(cells % MINUTES_PER_WEEK, minlength=MINUTES_PER_WEEK)
+
+    return doses.reshape(7, MINUTES_PER_DAY), dispensers.reshape(7, MINUTES_PER_DAY)
+
+
+def _minute_label(weekday, minute):
+    return Schedule.WEEKDAYS[weekday][1], f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def dispenser_report(dispenser_id):
+    """When one dispenser drops pills over the week"""
+    dispenser_ids, minute_of_week = load_schedule_arrays(dispenser_id)
+    doses = dispenser_occupancy(dispenser_ids, minute_of_week, dispenser_id)
+    busy_weekdays, busy_minutes = np.nonzero(doses)
+
+    return {
+        "dispenser": dispenser_id,
+        "total_doses": int(doses.sum()),
+        # Every minute with at least one drop, in week order
+        "busy_minutes": [
+            dict(zip(("weekday", "time"), _minute_label(weekday, minute)), doses=int(doses[weekday, minute]))
+            for weekday, minute in zip(busy_weekdays.tolist(), busy_minutes.tolist())
+        ],
+        "hourly_doses": doses.reshape(7, 24, 60).sum(axis=2).tolist(),
+    }
+
+
+def forecast_report():
+    dispenser_ids, minute_of_week = load_schedule_arrays()
+    doses, dispensers = fleet_occupancy(dispenser_ids, minute_of_week)
+
+    peak_weekday, peak_minute = np.unravel_index(np.argmax(doses), doses.shape)
+    busy = doses[doses > 0]
+    bucket_counts = np.histogram(
+        busy, bins=[1] + [edge + 1 for edge in LOAD_BUCKETS] + [np.inf]
+    )[0]
+
+    return {
+        "total_doses": int(minute_of_week.size),
+        "dispensers": int(np.unique(dispenser_ids).size),
+        "peak": {
+            **dict(zip(("weekday", "time"), _minute_label(peak_weekday, peak_minute))),
+            "doses": int(doses[peak_weekday, peak_minute]),
+            "dispensers": int(dispensers[peak_weekday, peak_minute]),
+        },
+        "busy_minutes": int(busy.size),
+        "doses_per_busy_minute": {
+            "p50": float(np.percentile(busy, 50)) if busy.size else 0.0,
+            "p95": float(np.percentile(busy, 95)) if busy.size else 0.0,
+            "p99": float(np.percentile(busy, 99)) if busy.size else 0.0,
+        },
+        # Number of minutes in the week whose load falls in each bucket,
+        # the last bucket is open ended
+        "load_histogram": [
+            {"max_doses": edge, "minutes": int(count)}
+            for edge, count in zip(LOAD_BUCKETS + [None], bucket_counts)
+        ],
+        # Doses per hour, one row per weekday
+        "hourly_doses": doses.reshape(7, 24, 60).sum(axis=2).tolist(),
+    }
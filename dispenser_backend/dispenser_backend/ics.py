@@ -0,0 +1,151 @@
+"""
+iCalendar (RFC 5545) export of a user's dose schedules.
+
+Every (container, weekday, time) becomes one weekly recurring VEVENT.
+Times are written as floating local times, so the phone shows them at the
+same wall clock time the dispenser drops the pills.
+
+The feed is produced as a generator. Under WSGI it is streamed as is;
+ASGI servers get aiter_calendar(), because Django would otherwise collect
+a synchronous iterator into a list before sending anything.
+"""
+import hashlib
+from datetime import date, datetime, timedelta, timezone
+from itertools import groupby, islice
+
+from asgiref.sync import sync_to_async
+from django.core import signing
+
+from .models import CalendarFeed, Dispenser, Schedule
+
+ICS_WEEKDAYS = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+
+# A Monday; the first occurrence of weekday N is ANCHOR_MONDAY + N days
+ANCHOR_MONDAY = date(2024, 1, 1)
+
+FEED_TOKEN_SALT = "dispenser_backend.schedule-calendar"
+
+# Calendar pieces handed to the event loop per trip to the worker thread
+ASYNC_BATCH_SIZE = 200
+
+
+def feed_token(user):
+    """Signs the user's current feed key, see rotate_feed_token()"""
+    feed, _ = CalendarFeed.objects.get_or_create(user=user)
+    return signing.dumps([user.pk, feed.key], salt=FEED_TOKEN_SALT)
+
+
+def rotate_feed_token(user):
+    """Revoke every feed URL of the user, returns the new token"""
+    feed, created = CalendarFeed.objects.get_or_create(user=user)
+    if not created:
+        feed.rotate()
+    return signing.dumps([user.pk, feed.key], salt=FEED_TOKEN_SALT)
+
+
+def user_id_from_feed_token(token):
+    """Returns None for tampered, malformed or revoked tokens"""
+    try:
+        user_id, key = signing.loads(token, salt=FEED_TOKEN_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if not CalendarFeed.objects.filter(user_id=user_id, key=key).exists():
+        return None
+    return user_id
+
+
+def schedule_etag(user_id):
+    """
+    Cheap fingerprint of everything the export contains.
+    Adding or deleting a dispenser changes the id set, editing one bumps its
+    schedule_version.
+    """
+    versions = Dispenser.objects.filter(owner_id=user_id).order_by('pk').values_list(
+        'pk', 'schedule_version'
+    )
+    digest = hashlib.sha1(repr(list(versions)).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _escape(text):
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+
+def _fold(line):
+    """Split content lines longer than 75 octets as required by RFC 5545"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Never split inside a multi-byte character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+        limit = 74  # continuation lines start with a space
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _event(dtstamp, container_id, dispenser_name, slot_number, pill_name, weekday, time):
+    start = datetime.combine(ANCHOR_MONDAY + timedelta(days=weekday), time)
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:schedule-{container_id}-{weekday}-{time.strftime('%H%M%S')}@pill-dispenser",
+        f"DTSTAMP:{dtstamp}",
+        f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}",
+        "DURATION:PT15M",
+        f"RRULE:FREQ=WEEKLY;BYDAY={ICS_WEEKDAYS[weekday]}",
+        f"SUMMARY:{_escape(pill_name)}",
+        f"DESCRIPTION:{_escape(f'{dispenser_name}, slot {slot_number}')}",
+        "END:VEVENT",
+    ]
+    return "".join(_fold(line) for line in lines)
+
+
+def iter_calendar(user_id):
+    """
+    Yield the calendar in small pieces.
+    Schedule rows are read with a server side iterator and never held in
+    memory all at once; duplicate rows collapse into one event.
+    """
+    dtstamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    rows = Schedule.objects.filter(
+        container__dispenser__owner_id=user_id,
+        container__dispenser__deleted_at__isnull=True,
+    ).order_by(
+        'container__dispenser__name', 'container__slot_number', 'weekday', 'time'
+    ).values_list(
+        'container_id',
+        'container__dispenser__name',
+        'container__slot_number',
+        'container__pill_name',
+        'weekday',
+        'time',
+    ).iterator(chunk_size=2000)
+
+    yield "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Pill Dispenser//Schedules//EN\r\nCALSCALE:GREGORIAN\r\n"
+    yield _fold("X-WR-CALNAME:Pill schedule")
+    for row, _ in groupby(rows):
+        yield _event(dtstamp, *row)
+    yield "END:VCALENDAR\r\n"
+
+
+async def aiter_calendar(user_id):
+    """
+    iter_calendar() for ASGI. The generator, and its database cursor, keep
+    running in the one sync thread; pieces come back in batches so the
+    whole calendar is never held in memory.
+    """
+    pieces = iter_calendar(user_id)
+    next_batch = sync_to_async(lambda: "".join(islice(pieces, ASYNC_BATCH_SIZE)))
+    while batch := await next_batch():
+        yield batch
@@ -0,0 +1,148 @@
+"""
+Idempotency-Key support for mutating API views.
+
+The first request with a given key inserts an in-flight IdempotencyRecord
+before the view runs and stores the response when it finishes. Retries
+with the same key get the stored response back without running the view
+again. A duplicate that arrives while the first request is still running
+waits for it instead of running in parallel; the unique (user, key)
+constraint decides which request goes first.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+IDEMPOTENT_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+POLL_INTERVAL = 0.05
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = 422
+    default_detail = "This Idempotency-Key was already used for a different request."
+    default_code = 'idempotency_key_reused'
+
+
+class RequestInProgress(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is still being processed."
+    default_code = 'request_in_progress'
+
+
+class _Replay(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+def clear_expired_records():
+    return IdempotencyRecord.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+def request_fingerprint(request):
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.get_full_path().encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _claim(user, key, fingerprint):
+    """
+    Returns (record, None) if this request gets to run the view, or
+    (None, record) with the completed record it should replay.
+    """
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT.total_seconds()
+    while True:
+        now = timezone.now()
+        IdempotencyRecord.objects.filter(user=user, key=key, expires_at__lte=now).delete()
+        try:
+            with transaction.atomic():
+                record = IdempotencyRecord.objects.create(
+                    user=user,
+                    key=key,
+                    request_fingerprint=fingerprint,
+                    expires_at=now + settings.IDEMPOTENCY_KEY_TTL,
+                )
+            return record, None
+        except IntegrityError:
+            pass
+
+        while True:
+            existing = IdempotencyRecord.objects.filter(user=user, key=key).first()
+            if existing is None:
+                # The request holding the key failed and released it
+                break
+            if existing.request_fingerprint != fingerprint:
+                raise IdempotencyKeyReused()
+            if existing.status_code is not None:
+                return None, existing
+            if time.monotonic() > deadline:
+                raise RequestInProgress()
+            time.sleep(POLL_INTERVAL)
+
+
+class IdempotentMixin:
+    """
+    Put first in the bases of an APIView whose unsafe methods should honour
+    the Idempotency-Key header.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        # Authentication and permission checks run first so keys are per user
+        super().initial(request, *args, **kwargs)
+
+        self.idempotency_record = None
+        key = request.headers.get('Idempotency-Key')
+        if not key or request.method not in IDEMPOTENT_METHODS:
+            return
+        if len(key) > 255:
+            raise ValidationError({"detail": "Idempotency-Key must be at most 255 characters."})
+
+        record, completed = _claim(request.user, key, request_fingerprint(request))
+        if completed is not None:
+            raise _Replay(Response(
+                completed.response_body,
+                status=completed.status_code,
+                headers={'Idempotent-Replayed': 'true'},
+            ))
+        self.idempotency_record = record
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            # Still set when an exception escaped the view and
+            # finalize_response never ran; free the key for a real retry
+            record = getattr(self, 'idempotency_record', None)
+            if record is not None:
+                self.idempotency_record = None
+                record.delete()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, _Replay):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+
+        record = getattr(self, 'idempotency_record', None)
+        if record is None:
+            return response
+        self.idempotency_record = None
+
+        if response.status_code >= 500:
+            # Let the client retry for real
+            record.delete()
+        else:
+            record.status_code = response.status_code
+            record.response_body = getattr(response, 'data', None)
+            record.save(update_fields=['status_code', 'response_body'])
+        return response
@@ -0,0 +1,249 @@
+import asyncio
+import gzip
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dispenser_backend.models import Dispenser
+
+
+def _summarize(samples):
+    """p50/p95/max of a list of seconds, in milliseconds"""
+    samples = sorted(samples)
+    p95 = samples[max(0, int(len(samples) * 0.95) - 1)]
+    return (
+        f"p50={statistics.median(samples) * 1000:.2f}ms "
+        f"p95={p95 * 1000:.2f}ms "
+        f"max={samples[-1] * 1000:.2f}ms"
+    )
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmarks for the dispenser backend, run against the configured database"
+
+    def add_arguments(self, parser):
+        scenarios = parser.add_subparsers(dest='scenario', required=True)
+
+        push = scenarios.add_parser('push', help="Latency of schedule pushes to connected dispensers")
+        push.add_argument('--connections', type=int, default=2000)
+        push.add_argument('--edits', type=int, default=200, help="Single-slot edits pushed one at a time while the other sockets idle")
+        push.add_argument('--rounds', type=int, default=0, help="Also time this many broadcasts to every socket at once")
+
+        render = scenarios.add_parser('render', help="Payload size and render time of list-all-user-dispensers")
+        render.add_argument('email', help="Account to render, ideally a large one")
+        render.add_argument('--fields', default='id,name,containers.slot_number,containers.pill_name,containers.schedules.weekday,containers.schedules.time')
+        render.add_argument('--repeat', type=int, default=5)
+
+        templates = scenarios.add_parser('templates', help="Throughput of applying a schedule template to every container of an account")
+        templates.add_argument('email', help="Account whose containers are the targets")
+        templates.add_argument('--doses-per-day', type=int, default=2)
+
+        throttle = scenarios.add_parser('throttle', help="Cost of a throttled login compared to a failed one")
+        throttle.add_argument('--attempts', type=int, default=20)
+
+    def handle(self, *args, **options):
+        handler = getattr(self, f"bench_{options['scenario']}")
+        handler(**options)
+
+    def bench_push(self, connections, edits, rounds, **options):
+        from dispenser_backend.consumers import device_token
+
+        dispensers = list(Dispenser.objects.only('pk', 'serial_id')[:connections])
+        if not dispensers:
+            raise CommandError("No dispensers in the database to connect as")
+
+        asyncio.run(self._bench_push(
+            [(dispenser.serial_id, device_token(dispenser)) for dispenser in dispensers], edits, rounds
+        ))
+
+    def bench_render(self, email, fields, repeat, **options):
+        from django.contrib.auth import get_user_model
+        from rest_framework.renderers import JSONRenderer
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+
+        from dispenser_backend.middleware import brotli
+        from dispenser_backend.renderers import ORJSONRenderer
+        from dispenser_backend.serializers import DispenserSerializer
+
+        try:
+            user = get_user_model().objects.get(email=email)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {email}")
+
+        dispensers = list(
+            Dispenser.objects.filter(owner=user).select_related('owner').prefetch_related('containers__schedules')
+        )
+        factory = APIRequestFactory()
+        variants = [
+            ("DRF JSON, all fields", JSONRenderer(), ''),
+            ("orjson, all fields", ORJSONRenderer(), ''),
+            ("orjson, ?fields=", ORJSONRenderer(), fields),
+        ]
+
+        self.stdout.write(f"{len(dispensers)} dispensers for {email}")
+        for label, renderer, requested in variants:
+            request = Request(factory.get('/', {'fields': requested} if requested else {}))
+            serialize_times, render_times = [], []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                data = DispenserSerializer(dispensers, many=True, context={'request': request}).data
+                serialized = time.perf_counter()
+                body = renderer.render(data)
+                serialize_times.append(serialized - started)
+                render_times.append(time.perf_counter() - serialized)
+
+            sizes = f"{len(body)}B raw, {len(gzip.compress(body))}B gzip"
+            if brotli is not None:
+                sizes += f", {len(brotli.compress(body, quality=5))}B br"
+            self.stdout.write(
+                f"{label:>22}: serialize {min(serialize_times) * 1000:.1f}ms, "
+                f"render {min(render_times) * 1000:.1f}ms, {sizes}"
+            )
+
+    def bench_templates(self, email, doses_per_day, **options):
+        import datetime
+
+        from django.contrib.auth import get_user_model
+        from django.db import transaction
+
+        from dispenser_backend.models import Container, ScheduleTemplate, ScheduleTemplateEntry
+        from dispenser_backend.schedule_templates import apply_schedule_template
+
+        try:
+            user = get_user_model().objects.get(email=email)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {email}")
+
+        # Everything happens in a transaction that is rolled back at the end
+        with transaction.atomic():
+            template = ScheduleTemplate.objects.create(owner=user, name="bench template")
+            ScheduleTemplateEntry.objects.bulk_create([
+                ScheduleTemplateEntry(template=template, weekday=weekday, time=datetime.time(8 + dose * 12 // doses_per_day))
+                for weekday in range(7)
+                for dose in range(doses_per_day)
+            ])
+            containers = list(
+                Container.objects.select_related('dispenser').select_for_update(of=('self',)).filter(
+                    dispenser__owner=user, dispenser__deleted_at__isnull=True
+                )
+            )
+
+            started = time.perf_counter()
+            written = apply_schedule_template(template, containers)
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"Applied {doses_per_day * 7} entries to {len(containers)} containers "
+            f"({written} schedules) in {elapsed * 1000:.1f}ms: "
+            f"{len(containers) / elapsed:.0f} containers/s, {written / elapsed:.0f} schedules/s"
+        )
+
+    def bench_throttle(self, attempts, **options):
+        from django.core.cache import cache
+        from django.test import override_settings
+        from django.urls import reverse
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        url = reverse('login')
+        body = {'email': 'bench@example.invalid', 'password': 'not-the-password'}
+
+        def timed_attempts():
+            samples = []
+            for _ in range(attempts):
+                started = time.perf_counter()
+                response = client.post(url, body, format='json')
+                samples.append(time.perf_counter() - started)
+            return samples, response.status_code
+
+        # A private cache, so the clear() calls below never flush the shared
+        # Redis database that holds the live throttle buckets and channels
+        private_cache = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench-throttle'}}
+        with override_settings(CACHES=private_cache):
+            cache.clear()
+            roomy = {'login_ip': (10 ** 6, 1), 'login_account': (10 ** 6, 1), 'register_ip': (10 ** 6, 1)}
+            with override_settings(AUTH_THROTTLE_RATES=roomy):
+                samples, status_code = timed_attempts()
+            self.stdout.write(f"Failed login ({status_code}): {_summarize(samples)}")
+
+            cache.clear()
+            exhausted = {'login_ip': (1, 3600), 'login_account': (1, 3600), 'register_ip': (1, 3600)}
+            with override_settings(AUTH_THROTTLE_RATES=exhausted):
+                client.post(url, body, format='json')
+                samples, status_code = timed_attempts()
+            self.stdout.write(f"Throttled login ({status_code}): {_summarize(samples)}")
+            cache.clear()
+
+    async def _bench_push(self, devices, edits, rounds):
+        from channels.layers import get_channel_layer
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+
+        from dispenser_backend.consumers import dispenser_group_name, open_connection_count
+        from dispenser_backend.routing import websocket_urlpatterns
+
+        application = URLRouter(websocket_urlpatterns)
+        channel_layer = get_channel_layer()
+        communicators = [
+            WebsocketCommunicator(application, f"/ws/dispensers/{serial_id}/?token={token}")
+            for serial_id, token in devices
+        ]
+
+        started = time.perf_counter()
+        # Handshakes queue up behind one database thread, allow for that
+        await asyncio.gather(*(communicator.connect(timeout=120) for communicator in communicators))
+        self.stdout.write(
+            f"Connected {open_connection_count()} sockets in this process "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+        # What a user sees: one slot edit reaching its dispenser while every
+        # other socket stays connected and idle
+        latencies = []
+        for edit in range(edits):
+            index = edit * 7919 % len(devices)
+            await channel_layer.group_send(dispenser_group_name(devices[index][0]), {
+                "type": "schedule.update",
+                "container": {"slot_number": 1, "pill_name": "bench", "schedules": []},
+                "sent_at": time.time(),
+            })
+            latencies.append(await self._receive_latency(communicators[index]))
+        if latencies:
+            within = sum(latency <= 1 for latency in latencies)
+            self.stdout.write(
+                f"Single edit with {len(communicators)} idle sockets: {_summarize(latencies)}, "
+                f"{within}/{len(latencies)} delivered within 1s"
+            )
+
+        latencies = []
+        for _ in range(rounds):
+            round_started = time.perf_counter()
+            await asyncio.gather(*(
+                channel_layer.group_send(dispenser_group_name(serial_id), {
+                    "type": "schedule.update",
+                    "container": {"slot_number": 1, "pill_name": "bench", "schedules": []},
+                    "sent_at": time.time(),
+                })
+                for serial_id, _ in devices
+            ))
+            latencies_this_round = await asyncio.gather(*(
+                self._receive_latency(communicator) for communicator in communicators
+            ))
+            latencies.extend(latencies_this_round)
+            self.stdout.write(
+                f"Round fanned out to {len(latencies_this_round)} sockets in "
+                f"{time.perf_counter() - round_started:.3f}s"
+            )
+
+        if latencies:
+            self.stdout.write(f"Broadcast latency over {len(latencies)} messages: {_summarize(latencies)}")
+
+        await asyncio.gather(*(communicator.disconnect() for communicator in communicators))
+
+    @staticmethod
+    async def _receive_latency(communicator):
+        message = await communicator.receive_json_from(timeout=10)
+        return time.time() - message["sent_at"]
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from dispenser_backend.idempotency import clear_expired_records
+
+
+class Command(BaseCommand):
+    help = "Delete stored Idempotency-Key responses whose TTL has passed"
+
+    def handle(self, *args, **options):
+        deleted = clear_expired_records()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency records"))
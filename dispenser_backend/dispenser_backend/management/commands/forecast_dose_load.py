@@ -0,0 +1,60 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from dispenser_backend.forecast import dispenser_report, forecast_report
+
+
+class Command(BaseCommand):
+    help = "Report fleet-wide peak dose load per minute of the week"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help="Print the full report as JSON")
+        parser.add_argument('--dispenser', type=int, help="Report the doses of this one dispenser instead")
+
+    def handle(self, *args, **options):
+        if options['dispenser'] is not None:
+            self._report_dispenser(options['dispenser'], options['json'])
+            return
+
+        started = time.perf_counter()
+        report = forecast_report()
+        elapsed = time.perf_counter() - started
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        peak = report['peak']
+        self.stdout.write(
+            f"{report['total_doses']} weekly doses on {report['dispensers']} dispensers "
+            f"(computed in {elapsed:.2f}s)"
+        )
+        self.stdout.write(
+            f"Peak minute: {peak['weekday']} {peak['time']} with {peak['doses']} doses "
+            f"on {peak['dispensers']} dispensers"
+        )
+        percentiles = report['doses_per_busy_minute']
+        self.stdout.write(
+            f"{report['busy_minutes']} minutes of the week have doses; per busy minute "
+            f"p50={percentiles['p50']:.0f} p95={percentiles['p95']:.0f} p99={percentiles['p99']:.0f}"
+        )
+
+        self.stdout.write("Minutes of the week by load:")
+        lower = 1
+        for bucket in report['load_histogram']:
+            label = f"{lower}-{bucket['max_doses']}" if bucket['max_doses'] else f"{lower}+"
+            self.stdout.write(f"  {label:>12} doses: {bucket['minutes']}")
+            if bucket['max_doses']:
+                lower = bucket['max_doses'] + 1
+
+    def _report_dispenser(self, dispenser_id, as_json):
+        report = dispenser_report(dispenser_id)
+        if as_json:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"{report['total_doses']} weekly doses on dispenser {dispenser_id}")
+        for minute in report['busy_minutes']:
+            self.stdout.write(f"  {minute['weekday']:<9} {minute['time']}: {minute['doses']} doses")
@@ -0,0 +1,243 @@
+import argparse
+import datetime
+import io
+import random
+import time
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from dispenser_backend.models import (
+    Container,
+    Dispenser,
+    DispenserSummary,
+    ManufacturedSerial,
+    Schedule,
+)
+from dispenser_backend.scheduling import depletion_time
+from dispenser_backend.summaries import is_filled
+
+PILL_NAMES = [
+    "Aspirin 100mg", "Metformin 500mg", "Lisinopril 10mg", "Atorvastatin 20mg",
+    "Levothyroxine 50mcg", "Amlodipine 5mg", "Omeprazole 20mg", "Metoprolol 50mg",
+    "Simvastatin 40mg", "Losartan 50mg", "Vitamin D 1000IU", "Warfarin 5mg",
+    "Furosemide 40mg", "Gabapentin 300mg", "Sertraline 50mg", "Paracetamol 500mg",
+]
+
+# Dose times spread over waking hours, shifted per slot by up to half an hour
+FIRST_DOSE_MINUTE = 8 * 60
+LAST_DOSE_MINUTE = 22 * 60
+JITTER_MINUTES = [-30, -15, 0, 0, 15, 30]
+
+# Serial units available per manufacturing date
+UNITS_PER_DAY = 10000
+
+# Stands in for Schedule where only weekday and time are read; building
+# model instances would dominate the run time
+Dose = namedtuple('Dose', ['weekday', 'time'])
+
+
+def distribution(cast):
+    """argparse type for "value:weight,value:weight" lists"""
+    def parse(text):
+        values, weights = [], []
+        try:
+            for item in text.split(','):
+                value, weight = item.split(':')
+                values.append(cast(value.strip()))
+                weights.append(float(weight))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"expected value:weight pairs, got {text!r}")
+        if not values or min(weights) < 0 or sum(weights) <= 0:
+            raise argparse.ArgumentTypeError(f"weights must be non-negative and not all zero in {text!r}")
+        return values, weights
+    return parse
+
+
+def dispenser_size(value):
+    if value not in Dispenser.DISPENSER_SIZES:
+        raise ValueError(value)
+    return value
+
+
+def dose_times(doses_per_day, jitter):
+    times = []
+    for dose in range(doses_per_day):
+        minute = FIRST_DOSE_MINUTE
+        if doses_per_day > 1:
+            minute += dose * (LAST_DOSE_MINUTE - FIRST_DOSE_MINUTE) // (doses_per_day - 1)
+        minute = min(max(minute + jitter, 0), 24 * 60 - 1)
+        times.append(datetime.time(minute // 60, minute % 60))
+    return times
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the configured database with synthetic users, dispensers, containers "
+        "and schedules for load and performance testing. The same --seed always "
+        "produces the same data. Rows are written in chunks with bulk inserts, and "
+        "schedules with COPY on PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--dispensers-per-user', type=distribution(int), default='1:60,2:30,3:10',
+            help="count:weight pairs (default 1:60,2:30,3:10)"
+        )
+        parser.add_argument(
+            '--sizes', type=distribution(dispenser_size), default='S:50,M:35,L:15',
+            help="size:weight pairs (default S:50,M:35,L:15)"
+        )
+        parser.add_argument(
+            '--fill-ratio', type=float, default=0.6,
+            help="Chance that a slot holds a pill and has schedules (default 0.6)"
+        )
+        parser.add_argument(
+            '--doses-per-day', type=distribution(int), default='1:40,2:35,3:20,4:5',
+            help="doses:weight pairs for filled slots, every dose repeats daily (default 1:40,2:35,3:20,4:5)"
+        )
+        parser.add_argument('--prefix', default='fixture', help="Prefix of generated usernames and emails")
+        parser.add_argument('--password', default='fixture-password', help="Password of every generated user")
+        parser.add_argument(
+            '--serial-start', type=datetime.date.fromisoformat, default=datetime.date(2000, 1, 1),
+            help="Manufacturing date of the first generated serial, YYYY-MM-DD"
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Users written per transaction")
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['chunk_size'] < 1:
+            raise CommandError("--users and --chunk-size must be positive")
+        if not 0 <= options['fill_ratio'] <= 1:
+            raise CommandError("--fill-ratio must be between 0 and 1")
+
+        User = get_user_model()
+        if User.objects.filter(username=f"{options['prefix']}1").exists():
+            raise CommandError(f"Users with prefix {options['prefix']!r} already exist, pick another --prefix")
+
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        # Hashing is deliberately slow, so every user shares one hash
+        self.password_hash = make_password(options['password'])
+        self.now = timezone.localtime()
+        self.serial_number = 0
+        self.totals = dict.fromkeys(['users', 'dispensers', 'containers', 'schedules'], 0)
+
+        started = time.perf_counter()
+        for first in range(1, options['users'] + 1, options['chunk_size']):
+            last = min(first + options['chunk_size'], options['users'] + 1)
+            try:
+                with transaction.atomic():
+                    self._write_chunk(range(first, last))
+            except IntegrityError as e:
+                raise CommandError(f"Generated rows collide with existing ones ({e}), try another --serial-start")
+            self.stdout.write(
+                f"{self.totals['users']} users, {self.totals['dispensers']} dispensers, "
+                f"{self.totals['containers']} containers, {self.totals['schedules']} schedules"
+            )
+
+        elapsed = time.perf_counter() - started
+        rows = sum(self.totals.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)"
+        ))
+
+    def _next_serial(self, size):
+        date = self.options['serial_start'] + datetime.timedelta(days=self.serial_number // UNITS_PER_DAY)
+        serial_id = f"{size}-{date:%Y%m%d}-{self.serial_number % UNITS_PER_DAY:04d}"
+        self.serial_number += 1
+        return serial_id
+
+    def _slot_plan(self, slot_number):
+        """(pill_name, pill_count, dose times) of one slot"""
+        if self.rng.random() >= self.options['fill_ratio']:
+            return Container.empty_pill_name(slot_number), 0, []
+        doses_per_day = self.rng.choices(*self.options['doses_per_day'])[0]
+        return (
+            self.rng.choice(PILL_NAMES),
+            self.rng.randint(0, 120),
+            dose_times(doses_per_day, self.rng.choice(JITTER_MINUTES)),
+        )
+
+    def _write_chunk(self, numbers):
+        prefix = self.options['prefix']
+        users = get_user_model().objects.bulk_create([
+            get_user_model()(
+                email=f"{prefix}{number}@example.com",
+                username=f"{prefix}{number}",
+                phoneNumber=f"1555{number % 10000000:07d}",
+                password=self.password_hash,
+            )
+            for number in numbers
+        ])
+
+        dispensers = []
+        for user in users:
+            for index in range(1, self.rng.choices(*self.options['dispensers_per_user'])[0] + 1):
+                size = self.rng.choices(*self.options['sizes'])[0]
+                dispensers.append(Dispenser(
+                    owner=user, name=f"Dispenser {index}", serial_id=self._next_serial(size), size=size
+                ))
+        ManufacturedSerial.objects.bulk_create(
+            [ManufacturedSerial(serial_id=dispenser.serial_id) for dispenser in dispensers],
+            batch_size=5000,
+            ignore_conflicts=True,
+        )
+        Dispenser.objects.bulk_create(dispensers, batch_size=5000)
+
+        containers, container_times = [], []
+        summaries = {user.pk: DispenserSummary(owner_id=user.pk) for user in users}
+        for dispenser in dispensers:
+            summary = summaries[dispenser.owner_id]
+            summary.dispenser_count += 1
+            for slot_number in range(1, dispenser.max_containers + 1):
+                pill_name, pill_count, times = self._slot_plan(slot_number)
+                weekly = [Dose(weekday, dose) for weekday in range(7) for dose in times]
+                containers.append(Container(
+                    dispenser=dispenser,
+                    slot_number=slot_number,
+                    pill_name=pill_name,
+                    pill_count=pill_count,
+                    runs_out_at=depletion_time(weekly, pill_count, self.now),
+                ))
+                container_times.append(weekly)
+                summary.filled_slots += is_filled(slot_number, pill_name)
+                summary.weekly_doses += len(weekly)
+        Container.objects.bulk_create(containers, batch_size=5000)
+
+        schedules = [
+            (container.pk, schedule.weekday, schedule.time)
+            for container, weekly in zip(containers, container_times)
+            for schedule in weekly
+        ]
+        if connection.vendor == 'postgresql':
+            self._copy_schedules(schedules)
+        else:
+            self._insert_schedules(schedules)
+        DispenserSummary.objects.bulk_create(summaries.values(), batch_size=5000)
+
+        self.totals['users'] += len(users)
+        self.totals['dispensers'] += len(dispensers)
+        self.totals['containers'] += len(containers)
+        self.totals['schedules'] += len(schedules)
+
+    def _insert_schedules(self, schedules):
+        table = connection.ops.quote_name(Schedule._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {table} (container_id, weekday, time) VALUES (%s, %s, %s)",
+                [(container_id, weekday, dose.strftime("%H:%M:%S")) for container_id, weekday, dose in schedules],
+            )
+
+    def _copy_schedules(self, schedules):
+        table = connection.ops.quote_name(Schedule._meta.db_table)
+        buffer = io.StringIO("".join(
+            f"{container_id}\t{weekday}\t{dose:%H:%M:%S}\n" for container_id, weekday, dose in schedules
+        ))
+        with connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table} (container_id, weekday, time) FROM STDIN", buffer)
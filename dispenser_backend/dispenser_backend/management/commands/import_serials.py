@@ -0,0 +1,94 @@
+import csv
+import io
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from dispenser_backend.models import ManufacturedSerial, SERIAL_ID_PATTERN
+
+
+class Command(BaseCommand):
+    help = (
+        "Load manufactured serial IDs from a CSV file into the inventory. "
+        "The first column of every row is the serial; a header row is skipped. "
+        "Rows are streamed in fixed-size chunks so memory use does not grow with the file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help="Path to the CSV file, or - for stdin")
+        parser.add_argument('--batch-size', type=int, default=50000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive")
+
+        if options['csv_path'] == '-':
+            self._import(sys.stdin, batch_size)
+        else:
+            with open(options['csv_path'], newline='') as csv_file:
+                self._import(csv_file, batch_size)
+
+    def _import(self, csv_file, batch_size):
+        serials = self._valid_serials(csv.reader(csv_file))
+        load_chunk = self._copy_chunk if connection.vendor == 'postgresql' else self._bulk_create_chunk
+
+        started = time.perf_counter()
+        total = 0
+        self.invalid = 0
+        if connection.vendor == 'postgresql':
+            self._create_staging_table()
+
+        while True:
+            chunk = list(islice(serials, batch_size))
+            if not chunk:
+                break
+            with transaction.atomic():
+                load_chunk(chunk)
+            total += len(chunk)
+            self.stdout.write(f"{total} serials processed")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {total} serials in {time.perf_counter() - started:.1f}s "
+            f"({self.invalid} invalid rows skipped)"
+        ))
+
+    def _valid_serials(self, rows):
+        for line_number, row in enumerate(rows, start=1):
+            if not row:
+                continue
+            serial_id = row[0].strip()
+            if SERIAL_ID_PATTERN.match(serial_id):
+                yield serial_id
+            elif line_number > 1:
+                # Anything on the first line that doesn't parse is the header
+                self.invalid += 1
+                self.stderr.write(f"Line {line_number}: invalid serial ID {serial_id!r}")
+
+    def _bulk_create_chunk(self, chunk):
+        ManufacturedSerial.objects.bulk_create(
+            [ManufacturedSerial(serial_id=serial_id) for serial_id in chunk],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+    def _create_staging_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMPORARY TABLE IF NOT EXISTS serial_import (serial_id varchar(20))"
+            )
+
+    def _copy_chunk(self, chunk):
+        table = ManufacturedSerial._meta.db_table
+        buffer = io.StringIO("\n".join(chunk) + "\n")
+        with connection.cursor() as cursor:
+            cursor.copy_expert("COPY serial_import (serial_id) FROM STDIN", buffer)
+            cursor.execute(
+                f"INSERT INTO {table} (serial_id, imported_at) "
+                f"SELECT DISTINCT serial_id, now() FROM serial_import "
+                f"ON CONFLICT (serial_id) DO NOTHING"
+            )
+            cursor.execute("TRUNCATE serial_import")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from dispenser_backend.purge import DEFAULT_BATCH_SIZE, purge_deleted_dispensers
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove the containers and schedules of deleted dispensers in small batches. "
+        "Deletes normally purge themselves in the background; run this from cron to "
+        "finish any purge that was interrupted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        purged = purge_deleted_dispensers(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} deleted dispensers"))
@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dispenser_backend.models import DispenserSummary
+from dispenser_backend.summaries import COUNTERS, recount
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount every owner's dispenser summary from the dispensers, containers "
+        "and schedules, and fix the rows that drifted or are missing"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report the drift")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        owner_ids = get_user_model().objects.order_by('pk').values_list('pk', flat=True)
+
+        checked = drifted = created = 0
+        last_id = 0
+        while True:
+            batch = list(owner_ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]
+
+            with transaction.atomic():
+                # Lock first: a view that already applied its delta is waited
+                # for, so the recount includes its change
+                summaries = DispenserSummary.objects.select_for_update().in_bulk(batch)
+                counts = recount(batch)
+                to_update, to_create = [], []
+                for owner_id in batch:
+                    actual = counts.get(owner_id, dict.fromkeys(COUNTERS, 0))
+                    summary = summaries.get(owner_id)
+                    if summary is None:
+                        to_create.append(DispenserSummary(owner_id=owner_id, **actual))
+                    elif any(getattr(summary, counter) != actual[counter] for counter in COUNTERS):
+                        for counter in COUNTERS:
+                            setattr(summary, counter, actual[counter])
+                        to_update.append(summary)
+
+                if not options['dry_run']:
+                    DispenserSummary.objects.bulk_create(to_create, ignore_conflicts=True)
+                    DispenserSummary.objects.bulk_update(to_update, COUNTERS)
+
+            checked += len(batch)
+            drifted += len(to_update)
+            created += len(to_create)
+
+        verb = "Would fix" if options['dry_run'] else "Fixed"
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {checked} owners. {verb} {drifted} drifted and {created} missing summaries"
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from dispenser_backend.alerts import send_missed_dose_alerts, sweep_window
+
+
+class Command(BaseCommand):
+    help = (
+        "Text users about doses they missed in the last sweep window. "
+        "Run it from cron once per MISSED_DOSE_WINDOW; overlapping runs do not double-send."
+    )
+
+    def handle(self, *args, **options):
+        start, end = sweep_window()
+        alerted = send_missed_dose_alerts()
+        self.stdout.write(self.style.SUCCESS(
+            f"Alerted {alerted} users about doses due between {start:%a %H:%M} and {end:%a %H:%M}"
+        ))
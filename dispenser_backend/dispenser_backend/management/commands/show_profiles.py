@@ -0,0 +1,62 @@
+import io
+import json
+import pstats
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "List the slowest requests captured by ProfilingMiddleware, or show the "
+        "hottest functions and slowest SQL of one capture"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile_id', nargs='?', help="Show details of this capture")
+        parser.add_argument('--limit', type=int, default=20, help="Rows to list")
+
+    def handle(self, *args, **options):
+        directory = Path(settings.PROFILING_DIRECTORY)
+        if options['profile_id']:
+            self.show(directory, options['profile_id'], options['limit'])
+        else:
+            self.list(directory, options['limit'])
+
+    def list(self, directory, limit):
+        captures = [json.loads(path.read_text()) for path in directory.glob("*.json")]
+        if not captures:
+            self.stdout.write(f"No captured requests in {directory}")
+            return
+
+        captures.sort(key=lambda capture: capture['duration_ms'], reverse=True)
+        self.stdout.write(f"{'ms':>9} {'sql ms':>8} {'queries':>7} {'status':>6}  request")
+        for capture in captures[:limit]:
+            self.stdout.write(
+                f"{capture['duration_ms']:>9.1f} {capture['sql_ms']:>8.1f} "
+                f"{capture['query_count']:>7} {capture['status']:>6}  "
+                f"{capture['method']} {capture['path']}  [{capture['id']}]"
+            )
+
+    def show(self, directory, profile_id, limit):
+        try:
+            capture = json.loads((directory / f"{profile_id}.json").read_text())
+        except FileNotFoundError:
+            raise CommandError(f"No capture {profile_id} in {directory}")
+
+        self.stdout.write(
+            f"{capture['method']} {capture['path']} -> {capture['status']} in "
+            f"{capture['duration_ms']:.1f}ms, {capture['query_count']} queries "
+            f"taking {capture['sql_ms']:.1f}ms"
+        )
+
+        output = io.StringIO()
+        stats = pstats.Stats(str(directory / f"{profile_id}.prof"), stream=output)
+        stats.sort_stats('cumulative').print_stats(limit)
+        self.stdout.write(output.getvalue())
+
+        self.stdout.write("Slowest SQL:")
+        for query in sorted(capture['queries'], key=lambda query: query['duration_ms'], reverse=True)[:limit]:
+            sql = query['sql'] if len(query['sql']) <= 500 else query['sql'][:500] + " ..."
+            self.stdout.write(f"{query['duration_ms']:>9.3f}ms  {sql}")
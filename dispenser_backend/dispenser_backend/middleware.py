@@ -0,0 +1,173 @@
+import cProfile
+import json
+import random
+import re
+import time
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+from django.conf import settings
+from django.db import connection
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+
+def accepts_brotli(accept_encoding):
+    """Whether an Accept-Encoding header lists br with a non-zero q-value"""
+    for coding in accept_encoding.split(","):
+        name, *params = (part.strip() for part in coding.split(";"))
+        if name.lower() != "br":
+            continue
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Brotli when the client accepts it and the brotli package is installed,
+    Django's gzip otherwise. Streaming responses are always gzipped.
+    """
+    brotli_quality = 5
+
+    def process_response(self, request, response):
+        if (
+            brotli is None
+            or response.streaming
+            or response.has_header("Content-Encoding")
+            or len(response.content) < 200
+            or not accepts_brotli(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed_content = brotli.compress(response.content, quality=self.brotli_quality)
+        if len(compressed_content) >= len(response.content):
+            return response
+
+        response.content = compressed_content
+        response.headers["Content-Length"] = str(len(response.content))
+
+        # Same as GZipMiddleware: the body changed, so a strong ETag no
+        # longer describes it
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Captures a cProfile profile and every SQL statement of selected requests.
+
+    A request is profiled when it is picked by PROFILING_SAMPLE_RATE, or
+    when a staff user sends the X-Profile header. Each capture is written
+    to PROFILING_DIRECTORY as <id>.prof (pstats) plus <id>.json (request
+    details and SQL); only the newest PROFILING_MAX_FILES are kept. Use
+    "manage.py show_profiles" to read them.
+    """
+    header = "HTTP_X_PROFILE"
+    # URL arguments that grant access on their own, like the calendar feed
+    # token; they are masked before the path reaches a file name or capture
+    secret_kwargs = ("token",)
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        queries = []
+
+        def record_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append({
+                    "sql": sql,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                })
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with connection.execute_wrapper(record_query):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        profile_id = self.save(request, response, profiler, queries, duration_ms)
+        response["X-Profile-Id"] = profile_id
+        return response
+
+    def should_profile(self, request):
+        if self.header in request.META:
+            return self.is_staff(request)
+        return random.random() < settings.PROFILING_SAMPLE_RATE
+
+    def is_staff(self, request):
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            return user.is_staff
+
+        # API clients authenticate with JWT, which DRF only checks inside the view
+        from rest_framework.exceptions import AuthenticationFailed
+        from rest_framework_simplejwt.authentication import JWTAuthentication
+        try:
+            authenticated = JWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return authenticated is not None and authenticated[0].is_staff
+
+    def save(self, request, response, profiler, queries, duration_ms):
+        directory = Path(settings.PROFILING_DIRECTORY)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        path = self.redacted_path(request)
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", path.partition("?")[0]).strip("-")[:60] or "root"
+        profile_id = f"{time.time_ns()}-{request.method}-{slug}"
+        profiler.dump_stats(directory / f"{profile_id}.prof")
+        (directory / f"{profile_id}.json").write_text(json.dumps({
+            "id": profile_id,
+            "method": request.method,
+            "path": path,
+            "status": response.status_code,
+            "duration_ms": round(duration_ms, 3),
+            "query_count": len(queries),
+            "sql_ms": round(sum(query["duration_ms"] for query in queries), 3),
+            "queries": queries,
+        }))
+
+        self.rotate(directory)
+        return profile_id
+
+    def redacted_path(self, request):
+        path = request.get_full_path()
+        match = request.resolver_match
+        if match is not None:
+            for name in self.secret_kwargs:
+                if match.kwargs.get(name):
+                    path = path.replace(str(match.kwargs[name]), f"<{name}>")
+        return path
+
+    def rotate(self, directory):
+        # Ids start with a nanosecond timestamp, so names sort by age
+        captures = sorted(directory.glob("*.json"))
+        for stale in captures[:-settings.PROFILING_MAX_FILES]:
+            stale.unlink(missing_ok=True)
+            stale.with_suffix(".prof").unlink(missing_ok=True)
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:56
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_registered_serials(apps, schema_editor):
+    """Dispensers registered before the inventory existed stay valid"""
+    Dispenser = apps.get_model('dispenser_backend', 'Dispenser')
+    ManufacturedSerial = apps.get_model('dispenser_backend', 'ManufacturedSerial')
+    ManufacturedSerial.objects.bulk_create(
+        (ManufacturedSerial(serial_id=serial_id)
+         for serial_id in Dispenser.objects.values_list('serial_id', flat=True).iterator()),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispenser_backend', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ManufacturedSerial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('serial_id', models.CharField(max_length=20, unique=True)),
+                ('imported_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(backfill_registered_serials, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispenser_backend', '0002_manufacturedserial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dispenser',
+            name='schedule_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
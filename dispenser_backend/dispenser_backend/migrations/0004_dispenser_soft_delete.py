@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispenser_backend', '0003_dispenser_schedule_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='dispenser',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='dispenser',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='dispenser',
+            name='serial_id',
+            field=models.CharField(db_index=True, max_length=20),
+        ),
+        migrations.AddConstraint(
+            model_name='dispenser',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True)), fields=('owner', 'name'), name='unique_active_dispenser_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='dispenser',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True)), fields=('serial_id',), name='unique_active_dispenser_serial'),
+        ),
+    ]
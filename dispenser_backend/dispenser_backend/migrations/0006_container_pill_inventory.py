@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_runs_out_at(apps, schema_editor):
+    """
+    Existing containers start with no pills, so every one that has a dose
+    scheduled is already empty (see scheduling.depletion_time)
+    """
+    Container = apps.get_model('dispenser_backend', 'Container')
+    Schedule = apps.get_model('dispenser_backend', 'Schedule')
+    Container.objects.filter(
+        pk__in=Schedule.objects.values('container_id')
+    ).update(runs_out_at=django.utils.timezone.now())
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispenser_backend', '0005_idempotencyrecord'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='container',
+            name='pill_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='container',
+            name='runs_out_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_runs_out_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispenser_backend', '0008_schedule_templates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleAuditEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('container_id', models.BigIntegerField()),
+                ('dispenser_id', models.BigIntegerField()),
+                ('slot_number', models.PositiveIntegerField()),
+                ('action', models.CharField(choices=[('schedule_update', 'Schedule update'), ('pill_name_update', 'Pill name update'), ('container_update', 'Container update'), ('template_apply', 'Template applied')], max_length=20)),
+                ('before', models.JSONField()),
+                ('after', models.JSONField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['container_id', '-id'], name='audit_container_history')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_caregiverlink'),
+        ('dispenser_backend', '0009_schedule_audit_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DispenserSummary',
+            fields=[
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dispenser_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('dispenser_count', models.IntegerField(default=0)),
+                ('filled_slots', models.IntegerField(default=0)),
+                ('weekly_doses', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:27
+
+import dispenser_backend.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_caregiverlink'),
+        ('dispenser_backend', '0010_dispenser_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarFeed',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='calendar_feed', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('key', models.CharField(default=dispenser_backend.models.new_feed_key, max_length=32)),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispenser_backend', '0011_calendar_feed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='container',
+            name='runs_out_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='container',
+            index=models.Index(fields=['dispenser', 'runs_out_at'], name='container_runs_out'),
+        ),
+    ]
@@ -1,7 +1,24 @@
+import re
+import secrets
+
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 
+from .scheduling import depletion_time
+
+# Serial ID format: SIZE-YYYYMMDD-XXXX
+# Example: S-20250524-0001 (Small dispenser manufactured on May 24, 2025, unit 0001)
+SERIAL_ID_PATTERN = re.compile(r'^[SML]-\d{8}-\d{4}$')
+
+
+class ActiveDispenserManager(models.Manager):
+    """Hides dispensers that were deleted but not purged yet"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
 
 class Dispenser(models.Model):
     DISPENSER_SIZES = {
@@ -12,16 +29,36 @@ class Dispenser(models.Model):
 
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="dispensers")
     name = models.CharField(max_length=100)
-    serial_id = models.CharField(max_length=20, unique=True)
+    serial_id = models.CharField(max_length=20, db_index=True)
     size = models.CharField(max_length=1, choices=[
         ('S', 'Small - 4 containers'),
         ('M', 'Medium - 6 containers'),
         ('L', 'Large - 10 containers')
     ])
     created_at = models.DateTimeField(default=timezone.now)
+    # Bumped whenever anything shown in the calendar export changes
+    schedule_version = models.PositiveIntegerField(default=0)
+    # Set when the owner deletes the dispenser; its rows are purged later
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ActiveDispenserManager()
+    all_objects = models.Manager()
 
     class Meta:
-        unique_together = ("owner", "name")
+        # Deleted dispensers waiting for the purge must not block
+        # re-registering the same serial or name
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "name"],
+                condition=models.Q(deleted_at__isnull=True),
+                name="unique_active_dispenser_name",
+            ),
+            models.UniqueConstraint(
+                fields=["serial_id"],
+                condition=models.Q(deleted_at__isnull=True),
+                name="unique_active_dispenser_serial",
+            ),
+        ]
         ordering = ["name"]
 
     def __str__(self):
@@ -31,16 +68,45 @@ class Dispenser(models.Model):
     def max_containers(self):
         return self.DISPENSER_SIZES[self.size][1]
 
+    def bump_schedule_version(self):
+        """Invalidate cached calendar exports of this dispenser"""
+        Dispenser.objects.filter(pk=self.pk).update(
+            schedule_version=models.F('schedule_version') + 1
+        )
+
+    def soft_delete(self):
+        """
+        Hide the dispenser immediately, see purge.py for the actual deletion.
+        Returns False when it was already deleted, also by a concurrent
+        request: the conditional UPDATE waits for that one to commit.
+        """
+        self.deleted_at = timezone.now()
+        return Dispenser.all_objects.filter(pk=self.pk, deleted_at__isnull=True).update(
+            deleted_at=self.deleted_at
+        ) == 1
+
     def initialize_containers(self):
         """Create empty containers for this dispenser based on its size"""
         for slot in range(1, self.max_containers + 1):
             Container.objects.create(
                 dispenser=self,
                 slot_number=slot,
-                pill_name=f"Empty Slot {slot}"
+                pill_name=Container.empty_pill_name(slot)
             )
 
 
+class ManufacturedSerial(models.Model):
+    """
+    A serial ID that has actually left the factory.
+    Only serials listed here can be registered as dispensers.
+    """
+    serial_id = models.CharField(max_length=20, unique=True)
+    imported_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.serial_id
+
+
 class Container(models.Model):
     """
     One physical slot in the dispenser.
@@ -50,14 +116,42 @@ class Container(models.Model):
     dispenser = models.ForeignKey(Dispenser, on_delete=models.CASCADE, related_name="containers")
     slot_number = models.PositiveIntegerField()
     pill_name = models.CharField(max_length=100)
+    pill_count = models.PositiveIntegerField(default=0)
+    # When the last pill is expected to drop, kept in sync with pill_count
+    # and the schedules by update_depletion_forecast()
+    runs_out_at = models.DateTimeField(null=True, blank=True)
+    # Last time the dispenser reported pills dropping from this slot
+    last_dispensed_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         unique_together = ("dispenser", "slot_number")
         ordering = ["slot_number"]
+        # Low stock is read per owner: one range scan per dispenser
+        indexes = [models.Index(fields=["dispenser", "runs_out_at"], name="container_runs_out")]
 
     def __str__(self):
         return f"Slot {self.slot_number}: {self.pill_name}"
 
+    @staticmethod
+    def empty_pill_name(slot_number):
+        """Placeholder name of a slot nothing has been loaded into yet"""
+        return f"Empty Slot {slot_number}"
+
+    def replace_schedules(self, schedules):
+        """Swap this slot's drops for schedules, an iterable of {weekday, time} dicts"""
+        self.schedules.all().delete()
+        Schedule.objects.bulk_create([
+            Schedule(container=self, weekday=schedule['weekday'], time=schedule['time'])
+            for schedule in schedules
+        ])
+
+    def update_depletion_forecast(self):
+        """Recompute runs_out_at; call after pill_count or schedules change"""
+        self.runs_out_at = depletion_time(
+            self.schedules.all(), self.pill_count, timezone.localtime()
+        )
+        Container.objects.filter(pk=self.pk).update(runs_out_at=self.runs_out_at)
+
     # def initialize_empty_schedules(self):
     #     """Create empty schedules for this container"""
     #     for weekday in range(7):  # 0-6 for Monday-Sunday
@@ -92,3 +186,147 @@ class Schedule(models.Model):
 
     def __str__(self):
         return f"{self.container} → {self.get_weekday_display()} at {self.time}"
+
+
+class IdempotencyRecord(models.Model):
+    """
+    Response of a mutating request sent with an Idempotency-Key header.
+    status_code stays empty while the first request is still running.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    key = models.CharField(max_length=255)
+    request_fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ("user", "key")
+
+    def __str__(self):
+        return f"{self.key} ({self.user_id})"
+
+
+class MissedDoseAlert(models.Model):
+    """
+    One SMS sent to a user covering every dose they missed in a sweep
+    window. The unique constraint keeps overlapping sweeps from texting
+    twice.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="missed_dose_alerts")
+    window_start = models.DateTimeField()
+    dose_count = models.PositiveIntegerField()
+    sent_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ("user", "window_start")
+
+    def __str__(self):
+        return f"{self.dose_count} missed doses for {self.user_id} at {self.window_start}"
+
+
+class ScheduleTemplate(models.Model):
+    """A reusable regimen, e.g. "08:00 and 20:00 daily", to copy onto many slots"""
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="schedule_templates")
+    name = models.CharField(max_length=100)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ("owner", "name")
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+
+class ScheduleTemplateEntry(models.Model):
+    template = models.ForeignKey(ScheduleTemplate, on_delete=models.CASCADE, related_name="entries")
+    weekday = models.IntegerField(choices=Schedule.WEEKDAYS)
+    time = models.TimeField()
+
+    class Meta:
+        ordering = ["template", "weekday", "time"]
+
+    def __str__(self):
+        return f"{self.template} → {self.get_weekday_display()} at {self.time}"
+
+
+class ScheduleAuditEntry(models.Model):
+    """
+    Append-only record of one change to a slot's pill or schedules.
+    before and after hold {"pill_name", "schedules": [[weekday, "HH:MM:SS"], ...]}.
+    The container is referenced by id rather than a foreign key so the
+    history outlives the purge of a deleted dispenser.
+    """
+    SCHEDULE_UPDATE = "schedule_update"
+    PILL_NAME_UPDATE = "pill_name_update"
+    CONTAINER_UPDATE = "container_update"
+    TEMPLATE_APPLY = "template_apply"
+    ACTIONS = [
+        (SCHEDULE_UPDATE, "Schedule update"),
+        (PILL_NAME_UPDATE, "Pill name update"),
+        (CONTAINER_UPDATE, "Container update"),
+        (TEMPLATE_APPLY, "Template applied"),
+    ]
+
+    container_id = models.BigIntegerField()
+    dispenser_id = models.BigIntegerField()
+    slot_number = models.PositiveIntegerField()
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name="+")
+    action = models.CharField(max_length=20, choices=ACTIONS)
+    before = models.JSONField()
+    after = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # History is read newest first per container, paged by id
+        indexes = [models.Index(fields=["container_id", "-id"], name="audit_container_history")]
+
+    def __str__(self):
+        return f"{self.get_action_display()} of container {self.container_id} at {self.created_at}"
+
+
+class DispenserSummary(models.Model):
+    """
+    Per-owner counters for the app header, kept in step by the views that
+    change them (see summaries.py) so reading them is a single row fetch.
+    The reconcile_dispenser_summaries command recounts them from scratch.
+    """
+    owner = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="dispenser_summary"
+    )
+    dispenser_count = models.IntegerField(default=0)
+    # Slots that hold something other than their "Empty Slot N" placeholder
+    filled_slots = models.IntegerField(default=0)
+    # Schedule rows, each is one dose a week
+    weekly_doses = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.dispenser_count} dispensers of {self.owner_id}"
+
+    @property
+    def doses_per_day(self):
+        return round(self.weekly_doses / 7, 2)
+
+
+def new_feed_key():
+    return secrets.token_urlsafe(16)
+
+
+class CalendarFeed(models.Model):
+    """
+    Per-user secret signed into the calendar feed URL. Replacing key
+    revokes every URL handed out before.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="calendar_feed"
+    )
+    key = models.CharField(max_length=32, default=new_feed_key)
+
+    def __str__(self):
+        return f"Calendar feed of {self.user_id}"
+
+    def rotate(self):
+        self.key = new_feed_key()
+        self.save(update_fields=["key"])
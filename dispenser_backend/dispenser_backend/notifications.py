@@ -0,0 +1,50 @@
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from .consumers import dispenser_group_name
+
+
+def container_payload(container, schedules=None):
+    """What a device needs to reprogram one slot"""
+    if schedules is None:
+        schedules = container.schedules.all()
+    return {
+        "slot_number": container.slot_number,
+        "pill_name": container.pill_name,
+        "schedules": [
+            {"weekday": schedule.weekday, "time": schedule.time.strftime("%H:%M:%S")}
+            for schedule in schedules
+        ],
+    }
+
+
+def send_container_update(serial_id, payload):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    async_to_sync(channel_layer.group_send)(
+        dispenser_group_name(serial_id),
+        {
+            "type": "schedule.update",
+            "container": payload,
+            "sent_at": time.time(),
+        },
+    )
+
+
+def notify_container_changed(container, schedules=None):
+    """
+    Push the container's new state to its dispenser once the surrounding
+    transaction commits, so the device never sees a rolled back edit.
+    Pass schedules when they are already in memory to skip the query.
+
+    The edit is saved by then, so a channel layer failure is only logged;
+    it must not turn the committed write into an error response.
+    """
+    serial_id = container.dispenser.serial_id
+    payload = container_payload(container, schedules)
+    transaction.on_commit(lambda: send_container_update(serial_id, payload), robust=True)
@@ -0,0 +1,94 @@
+"""
+Deferred deletion of soft-deleted dispensers.
+
+DeleteDispenserView only stamps deleted_at. The rows hanging off the
+dispenser are removed here in bounded batches, each in its own short
+transaction, so no single statement has to lock a dispenser's whole
+history.
+"""
+import logging
+import queue
+import threading
+
+from django.db import connection, transaction
+
+from .models import Container, Dispenser, Schedule
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Background purges run on this many threads per process
+PURGE_WORKERS = 2
+
+_queue = queue.SimpleQueue()
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def _delete_in_batches(queryset, batch_size):
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            batch = list(queryset.order_by().values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return deleted
+            queryset.model.objects.filter(pk__in=batch).delete()
+        deleted += len(batch)
+
+
+def purge_dispenser(dispenser_id, batch_size=DEFAULT_BATCH_SIZE):
+    """Remove a soft-deleted dispenser and everything that belongs to it"""
+    deleted = _delete_in_batches(
+        Schedule.objects.filter(container__dispenser_id=dispenser_id), batch_size
+    )
+    deleted += _delete_in_batches(
+        Container.objects.filter(dispenser_id=dispenser_id), batch_size
+    )
+    deleted += Dispenser.all_objects.filter(
+        pk=dispenser_id, deleted_at__isnull=False
+    ).delete()[0]
+    return deleted
+
+
+def purge_deleted_dispensers(batch_size=DEFAULT_BATCH_SIZE):
+    """Purge every dispenser still waiting for it, returns how many"""
+    pending = Dispenser.all_objects.filter(deleted_at__isnull=False).values_list('pk', flat=True)
+    purged = 0
+    for dispenser_id in list(pending):
+        purge_dispenser(dispenser_id, batch_size)
+        purged += 1
+    return purged
+
+
+def _purge_worker():
+    while True:
+        dispenser_id = _queue.get()
+        try:
+            purge_dispenser(dispenser_id)
+        except Exception:
+            # The purge_deleted_dispensers command picks up whatever is left
+            logger.exception("Background purge of dispenser %s failed", dispenser_id)
+        finally:
+            connection.close()
+
+
+def _enqueue(dispenser_id):
+    with _workers_lock:
+        while len(_workers) < PURGE_WORKERS:
+            worker = threading.Thread(
+                target=_purge_worker, name=f"dispenser-purge-{len(_workers) + 1}", daemon=True
+            )
+            worker.start()
+            _workers.append(worker)
+    _queue.put(dispenser_id)
+
+
+def purge_in_background(dispenser_id):
+    """
+    Queue the purge once the soft delete has committed. PURGE_WORKERS
+    threads per process work through the queue, however many deletes come
+    in. Purges still queued when the process exits are left to the
+    purge_deleted_dispensers command.
+    """
+    transaction.on_commit(lambda: _enqueue(dispenser_id), robust=True)
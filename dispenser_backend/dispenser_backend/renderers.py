@@ -0,0 +1,26 @@
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Compact JSON rendered with orjson, several times faster than the
+    standard library on large nested payloads. Falls back to DRF's own
+    renderer when orjson is not installed or the client asked for
+    indented output.
+    """
+    _encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Lazy translations, Decimals and friends go through DRF's encoder
+        return orjson.dumps(data, default=self._encoder.default)
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .consumers import DispenserConsumer
+
+
+websocket_urlpatterns = [
+    path('ws/dispensers/<str:serial_id>/', DispenserConsumer.as_asgi(), name='dispenser-socket'),
+]
@@ -0,0 +1,85 @@
+"""
+Copying a ScheduleTemplate onto many containers at once.
+
+The old schedules of every target go in one DELETE and the new ones are
+produced by the database itself with a single INSERT ... SELECT that
+crosses the target containers with the template entries, so the cost of
+a request grows with the number of rows written, not with round trips.
+"""
+from collections import Counter, defaultdict
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .audit import container_state, record_change
+from .models import Container, Dispenser, Schedule, ScheduleAuditEntry, ScheduleTemplateEntry
+from .notifications import notify_container_changed
+from .scheduling import depletion_time
+from .summaries import adjust_summary, slot_change_deltas
+
+
+def _insert_from_template(template, container_ids):
+    schedule_table = connection.ops.quote_name(Schedule._meta.db_table)
+    container_table = connection.ops.quote_name(Container._meta.db_table)
+    entry_table = connection.ops.quote_name(ScheduleTemplateEntry._meta.db_table)
+    placeholders = ", ".join(["%s"] * len(container_ids))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {schedule_table} (container_id, weekday, time) "
+            f"SELECT c.id, e.weekday, e.time "
+            f"FROM {container_table} c CROSS JOIN {entry_table} e "
+            f"WHERE e.template_id = %s AND c.id IN ({placeholders})",
+            [template.pk, *container_ids],
+        )
+        return cursor.rowcount
+
+
+@transaction.atomic
+def apply_schedule_template(template, containers, actor=None):
+    """
+    Replace the schedules of containers (a list of Container with their
+    dispenser loaded, ideally locked) with the template's entries.
+    When actor is given every changed container is audited as theirs.
+    Returns the number of schedule rows written.
+    """
+    if not containers:
+        return 0
+
+    container_ids = [container.pk for container in containers]
+    entries = list(template.entries.all())
+
+    previous = defaultdict(list)
+    for schedule in Schedule.objects.filter(container_id__in=container_ids).order_by():
+        previous[schedule.container_id].append(schedule)
+
+    Schedule.objects.filter(container_id__in=container_ids).delete()
+    written = _insert_from_template(template, container_ids)
+
+    # Every target now has the same schedules, so the depletion forecast
+    # only depends on each container's pill count
+    now = timezone.localtime()
+    for container in containers:
+        container.runs_out_at = depletion_time(entries, container.pill_count, now)
+    Container.objects.bulk_update(containers, ['runs_out_at'], batch_size=1000)
+
+    Dispenser.objects.filter(
+        pk__in={container.dispenser_id for container in containers}
+    ).update(schedule_version=F('schedule_version') + 1)
+
+    summary_deltas = defaultdict(Counter)
+    for container in containers:
+        before = container_state(container, previous[container.pk])
+        after = container_state(container, entries)
+        summary_deltas[container.dispenser.owner_id].update(
+            slot_change_deltas(container.slot_number, before, after)
+        )
+        if actor is not None:
+            record_change(container, actor, ScheduleAuditEntry.TEMPLATE_APPLY, before, after)
+        notify_container_changed(container, entries)
+
+    for owner_id, deltas in summary_deltas.items():
+        adjust_summary(owner_id, **deltas)
+
+    return written
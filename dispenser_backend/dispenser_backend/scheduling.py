@@ -0,0 +1,39 @@
+"""
+Weekly dose arithmetic shared by the dashboards and alerting.
+
+Schedule times are wall clock times in the server's TIME_ZONE, so every
+"now" passed in here should come from timezone.localtime().
+"""
+from datetime import datetime, timedelta
+
+
+def next_occurrence(weekday, time, now):
+    """First datetime strictly after now that falls on weekday at time"""
+    days_ahead = (weekday - now.weekday()) % 7
+    candidate = datetime.combine(now.date() + timedelta(days=days_ahead), time, tzinfo=now.tzinfo)
+    if candidate <= now:
+        candidate += timedelta(days=7)
+    return candidate
+
+
+def next_dose(schedules, now):
+    """Earliest upcoming drop among schedules, or None if there are none"""
+    return min(
+        (next_occurrence(schedule.weekday, schedule.time, now) for schedule in schedules),
+        default=None,
+    )
+
+
+def depletion_time(schedules, pill_count, now):
+    """
+    When the last of pill_count pills drops, assuming every scheduled dose
+    takes one pill. None if nothing is scheduled, now if already empty.
+    """
+    upcoming = sorted(next_occurrence(schedule.weekday, schedule.time, now) for schedule in schedules)
+    if not upcoming:
+        return None
+    if pill_count <= 0:
+        return now
+
+    full_weeks, index = divmod(pill_count - 1, len(upcoming))
+    return upcoming[index] + timedelta(weeks=full_weeks)
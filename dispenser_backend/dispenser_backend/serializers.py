@@ -1,11 +1,44 @@
 # dispenser/serializers.py
 
 from rest_framework import serializers
-from .models import Dispenser, Container, Schedule
+from django.db.models import Exists, OuterRef
+from .models import Dispenser, Container, Schedule, ManufacturedSerial, ScheduleAuditEntry, ScheduleTemplate, ScheduleTemplateEntry, SERIAL_ID_PATTERN
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
+from .scheduling import next_dose
 import re
 
+class SparseFieldsMixin:
+    """
+    Honour ?fields=id,name,containers.pill_name on the request in context.
+    Dotted names reach into nested serializers; naming a nested field
+    without a dot keeps all of its fields.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        requested = request.query_params.get('fields') if request is not None else None
+        if not requested:
+            return fields
+
+        # Path of this serializer below the root, e.g. "containers.schedules."
+        names = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                names.append(node.field_name)
+            node = node.parent
+        prefix = "".join(f"{name}." for name in reversed(names))
+
+        below = [path[len(prefix):] for path in requested.split(',') if path.startswith(prefix)]
+        if not below or '' in below:
+            return fields
+
+        keep = {path.split('.')[0] for path in below}
+        return {name: field for name, field in fields.items() if name in keep}
+
+
 class ScheduleInputSerializer(serializers.Serializer):
     weekday = serializers.ChoiceField(choices=Schedule.WEEKDAYS)
     time    = serializers.TimeField()
@@ -16,7 +49,17 @@ class ContainerScheduleUpdateSerializer(serializers.Serializer):
     schedules      = ScheduleInputSerializer(many=True)
     pill_name      = serializers.CharField(required=False)
 
-class ScheduleSerializer(serializers.ModelSerializer):
+class ContainerUpdateSerializer(serializers.Serializer):
+    pill_name = serializers.CharField(max_length=100)
+    schedules = ScheduleInputSerializer(many=True)
+    pill_count = serializers.IntegerField(min_value=0, required=False)
+
+    def validate_pill_name(self, value):
+        if not value.strip():
+            raise serializers.ValidationError(_("Pill name cannot be empty"))
+        return value.strip()
+
+class ScheduleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Schedule
         fields = ['id', 'container', 'weekday', 'time']
@@ -41,12 +84,13 @@ class ScheduleSerializer(serializers.ModelSerializer):
         return data
 
 
-class ContainerSerializer(serializers.ModelSerializer):
+class ContainerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     schedules = ScheduleSerializer(many=True, read_only=True)
 
     class Meta:
         model = Container
-        fields = ['id', 'dispenser', 'slot_number', 'pill_name', 'schedules']
+        fields = ['id', 'dispenser', 'slot_number', 'pill_name', 'pill_count', 'runs_out_at', 'schedules']
+        read_only_fields = ['runs_out_at']
 
     def validate_slot_number(self, value):
         if value < 1:
@@ -81,7 +125,7 @@ class ContainerSerializer(serializers.ModelSerializer):
         return data
 
 
-class DispenserSerializer(serializers.ModelSerializer):
+class DispenserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     containers = ContainerSerializer(many=True, read_only=True)
     owner = serializers.ReadOnlyField(source='owner.username')
 
@@ -130,15 +174,18 @@ class RegisterDispenserSerializer(serializers.Serializer):
     name = serializers.CharField(max_length=100)
 
     def validate_serial_id(self, value):
-        # Serial ID format: SIZE-YYYYMMDD-XXXX
-        # Example: S-20250524-0001 (Small dispenser manufactured on May 24, 2025, unit 0001)
-        pattern = r'^[SML]-\d{8}-\d{4}$'
-        if not re.match(pattern, value):
+        if not SERIAL_ID_PATTERN.match(value):
             raise serializers.ValidationError(
                 _("Invalid serial ID format. Expected format: SIZE-YYYYMMDD-XXXX (e.g., S-20250524-0001)")
             )
-        
-        if Dispenser.objects.filter(serial_id=value).exists():
+
+        # One indexed lookup answers both "was this manufactured" and "is it taken"
+        registered = ManufacturedSerial.objects.filter(serial_id=value).annotate(
+            registered=Exists(Dispenser.objects.filter(serial_id=OuterRef('serial_id')))
+        ).values_list('registered', flat=True).first()
+        if registered is None:
+            raise serializers.ValidationError(_("Unknown serial ID"))
+        if registered:
             raise serializers.ValidationError(_("This dispenser is already registered"))
 
         return value
@@ -175,6 +222,34 @@ class UpdatePillNameSerializer(serializers.Serializer):
         return value.strip()
 
 
+class DispenseSerializer(serializers.Serializer):
+    dispenser_name = serializers.CharField()
+    slot_number = serializers.IntegerField()
+    count = serializers.IntegerField(min_value=1, default=1)
+
+
+class RefillSerializer(serializers.Serializer):
+    dispenser_name = serializers.CharField()
+    slot_number = serializers.IntegerField()
+    amount = serializers.IntegerField(min_value=1)
+
+
+class LowStockContainerSerializer(serializers.ModelSerializer):
+    dispenser_name = serializers.ReadOnlyField(source='dispenser.name')
+
+    class Meta:
+        model = Container
+        fields = ['id', 'dispenser_name', 'slot_number', 'pill_name', 'pill_count', 'runs_out_at']
+
+
+class ScheduleAuditEntrySerializer(serializers.ModelSerializer):
+    actor = serializers.ReadOnlyField(source='actor.username', default=None)
+
+    class Meta:
+        model = ScheduleAuditEntry
+        fields = ['id', 'action', 'actor', 'created_at', 'before', 'after']
+
+
 class UpdateDispenserNameSerializer(serializers.Serializer):
     current_name = serializers.CharField()
     new_name = serializers.CharField(max_length=100)
@@ -199,3 +274,83 @@ class UpdateDispenserNameSerializer(serializers.Serializer):
             ).exists():
                 raise serializers.ValidationError(_("You already have a dispenser with this name"))
         return data
+
+
+class ScheduleTemplateSerializer(serializers.ModelSerializer):
+    entries = ScheduleInputSerializer(many=True)
+
+    class Meta:
+        model = ScheduleTemplate
+        fields = ['id', 'name', 'entries']
+
+    def validate_name(self, value):
+        if not value.strip():
+            raise serializers.ValidationError(_("Template name cannot be empty"))
+        return value.strip()
+
+    def validate_entries(self, value):
+        if not value:
+            raise serializers.ValidationError(_("A template needs at least one schedule"))
+        doses = [(entry['weekday'], entry['time']) for entry in value]
+        if len(set(doses)) != len(doses):
+            raise serializers.ValidationError(_("A template cannot schedule the same weekday and time twice"))
+        return value
+
+    def validate(self, data):
+        request = self.context.get('request')
+        if request and request.user:
+            if ScheduleTemplate.objects.filter(owner=request.user, name=data['name']).exists():
+                raise serializers.ValidationError(_("You already have a template with this name"))
+        return data
+
+    def create(self, validated_data):
+        entries = validated_data.pop('entries')
+        template = ScheduleTemplate.objects.create(owner=self.context['request'].user, **validated_data)
+        ScheduleTemplateEntry.objects.bulk_create([
+            ScheduleTemplateEntry(template=template, **entry) for entry in entries
+        ])
+        return template
+
+
+class TemplateTargetSerializer(serializers.Serializer):
+    dispenser_id = serializers.IntegerField()
+    slot_number = serializers.IntegerField()
+
+
+class ApplyScheduleTemplateSerializer(serializers.Serializer):
+    targets = TemplateTargetSerializer(many=True, min_length=1, max_length=10000)
+
+
+class CaregiverContainerSerializer(serializers.ModelSerializer):
+    next_dose = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Container
+        fields = ['slot_number', 'pill_name', 'next_dose']
+
+    def get_next_dose(self, obj):
+        # schedules are prefetched, .all() does not hit the database
+        return next_dose(obj.schedules.all(), self.context['now'])
+
+
+class CaregiverDispenserSerializer(serializers.ModelSerializer):
+    containers = CaregiverContainerSerializer(many=True, read_only=True)
+    next_dose = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Dispenser
+        fields = ['id', 'name', 'size', 'containers', 'next_dose']
+
+    def get_next_dose(self, obj):
+        doses = [
+            next_dose(container.schedules.all(), self.context['now'])
+            for container in obj.containers.all()
+        ]
+        return min((dose for dose in doses if dose is not None), default=None)
+
+
+class CaregiverPatientSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    username = serializers.CharField()
+    email = serializers.EmailField()
+    dispensers = CaregiverDispenserSerializer(many=True, read_only=True)
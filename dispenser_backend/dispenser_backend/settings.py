@@ -1,6 +1,7 @@
 from pathlib import Path
 from datetime import timedelta
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -24,6 +25,7 @@ ALLOWED_HOSTS = ['*']
 # Application definition
 
 INSTALLED_APPS = [
+    'daphne',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -34,7 +36,8 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework_simplejwt',
     'dispenser_backend',   
-    'corsheaders'
+    'corsheaders',
+    'channels',
 ]
 
 
@@ -42,6 +45,43 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'dispenser_backend.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Reverse proxies in front of the app. Throttles key on the client IP
+    # they append to X-Forwarded-For; with 0 the header is ignored and
+    # REMOTE_ADDR is used, so clients cannot pick their own bucket
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+}
+
+# How long a stored Idempotency-Key response can be replayed, and how long
+# a duplicate request waits for the original one to finish
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+IDEMPOTENCY_WAIT_TIMEOUT = timedelta(seconds=10)
+
+# Missed dose alerts: a dose counts as missed GRACE after its time, and
+# each sweep covers one WINDOW worth of dose times per user in one SMS
+SMS_GATEWAY = os.environ.get('SMS_GATEWAY', 'dispenser_backend.sms.ConsoleSMSGateway')
+SMS_BATCH_SIZE = 100
+MISSED_DOSE_GRACE = timedelta(minutes=30)
+MISSED_DOSE_WINDOW = timedelta(minutes=15)
+
+# On-demand request profiling: a fraction of requests (0 disables sampling)
+# plus any staff request carrying an X-Profile header. Captures hold SQL and
+# request paths, so they are kept out of the source tree by default
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_DIRECTORY = os.environ.get(
+    'PROFILING_DIRECTORY', os.path.join(tempfile.gettempdir(), 'dispenser-profiles')
+)
+PROFILING_MAX_FILES = 200
+
+# Token buckets for the credential endpoints: (burst capacity, seconds to
+# refill it completely)
+AUTH_THROTTLE_RATES = {
+    'login_ip': (20, 60),
+    'login_account': (5, 300),
+    'register_ip': (5, 3600),
 }
 
 # JWT Settings
@@ -73,11 +113,13 @@ SIMPLE_JWT = {
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'dispenser_backend.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'dispenser_backend.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -100,6 +142,43 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'dispenser_backend.wsgi.application'
+ASGI_APPLICATION = 'dispenser_backend.asgi.application'
+
+
+# Channel layer used to push schedule changes to connected dispensers.
+# The in-memory layer only reaches sockets held by the same process; set
+# REDIS_URL to share it between nodes.
+if os.environ.get('REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [os.environ['REDIS_URL']],
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+
+
+# Cache shared by the workers; throttle buckets live here
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
 
 
 # Database
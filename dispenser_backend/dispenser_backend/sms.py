@@ -0,0 +1,51 @@
+"""
+Pluggable SMS delivery, selected with settings.SMS_GATEWAY.
+
+A gateway receives messages in batches so providers with a bulk API can
+send each batch in one call.
+"""
+import sys
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+SMSMessage = namedtuple('SMSMessage', ['to', 'body'])
+
+# Messages "sent" through LocMemSMSGateway, for tests
+outbox = []
+
+
+class BaseSMSGateway:
+    def send_batch(self, messages):
+        """Deliver a list of SMSMessage; raise to make the sweep retry them"""
+        raise NotImplementedError
+
+
+class ConsoleSMSGateway(BaseSMSGateway):
+    """
+    Writes messages to stream (stdout unless given) instead of sending
+    them; the local default, like Django's console email backend.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.RLock()
+
+    def send_batch(self, messages):
+        with self._lock:
+            for message in messages:
+                self.stream.write(f"SMS to {message.to}: {message.body}\n")
+            self.stream.flush()
+
+
+class LocMemSMSGateway(BaseSMSGateway):
+    """Keeps messages in sms.outbox"""
+
+    def send_batch(self, messages):
+        outbox.extend(messages)
+
+
+def get_gateway(**kwargs):
+    return import_string(settings.SMS_GATEWAY)(**kwargs)
@@ -0,0 +1,96 @@
+"""
+Denormalized per-owner dispenser counters.
+
+Every view that changes what the header counts applies its difference
+with a single F() UPDATE inside its own transaction, so the counters
+commit or roll back with the change itself. recount() rebuilds them from
+the real rows; it seeds an owner's row on first use and backs the
+reconcile_dispenser_summaries command.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, Count, F, Value
+from django.db.models.functions import Cast, Concat
+
+from .models import Container, Dispenser, DispenserSummary, Schedule
+
+COUNTERS = ('dispenser_count', 'filled_slots', 'weekly_doses')
+
+
+def is_filled(slot_number, pill_name):
+    return pill_name != Container.empty_pill_name(slot_number)
+
+
+def filled_containers():
+    """Containers of active dispensers that hold a pill, see is_filled()"""
+    return Container.objects.filter(dispenser__deleted_at__isnull=True).exclude(
+        pill_name=Concat(Value(Container.empty_pill_name('')), Cast('slot_number', output_field=CharField()))
+    )
+
+
+def recount(owner_ids=None):
+    """
+    {owner_id: {counter: value}} computed from the real rows, with one
+    grouped query per counter. Owners without any dispenser are absent.
+    """
+    querysets = {
+        'dispenser_count': Dispenser.objects.values(owner_pk=F('owner_id')),
+        'filled_slots': filled_containers().values(owner_pk=F('dispenser__owner_id')),
+        'weekly_doses': Schedule.objects.filter(
+            container__dispenser__deleted_at__isnull=True
+        ).values(owner_pk=F('container__dispenser__owner_id')),
+    }
+
+    counts = {}
+    for counter, queryset in querysets.items():
+        if owner_ids is not None:
+            queryset = queryset.filter(owner_pk__in=owner_ids)
+        for row in queryset.order_by().annotate(count=Count('pk')):
+            counts.setdefault(row['owner_pk'], dict.fromkeys(COUNTERS, 0))[counter] = row['count']
+    return counts
+
+
+def adjust_summary(owner_id, **deltas):
+    """
+    Add deltas (keyword per counter) to the owner's summary. Call after
+    the change has been written: an owner without a row yet gets one
+    recounted from the rows, which already include it.
+    """
+    deltas = {counter: delta for counter, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    summary = DispenserSummary.objects.filter(owner_id=owner_id)
+    increments = {counter: F(counter) + delta for counter, delta in deltas.items()}
+    if summary.update(**increments) or _create_summary(owner_id):
+        return
+    # Another transaction created the row first, from a recount that could
+    # not see this change
+    summary.update(**increments)
+
+
+def _create_summary(owner_id):
+    """Insert the owner's row from a recount, None if it already exists"""
+    counts = recount([owner_id]).get(owner_id, {})
+    try:
+        with transaction.atomic():
+            return DispenserSummary.objects.create(owner_id=owner_id, **counts)
+    except IntegrityError:
+        return None
+
+
+def get_summary(owner_id):
+    """The owner's summary row, created from a recount when missing"""
+    try:
+        return DispenserSummary.objects.get(owner_id=owner_id)
+    except DispenserSummary.DoesNotExist:
+        return _create_summary(owner_id) or DispenserSummary.objects.get(owner_id=owner_id)
+
+
+def slot_change_deltas(slot_number, before, after):
+    """Counter deltas between two audit.container_state() snapshots of a slot"""
+    return {
+        'filled_slots': (
+            is_filled(slot_number, after['pill_name']) - is_filled(slot_number, before['pill_name'])
+        ),
+        'weekly_doses': len(after['schedules']) - len(before['schedules']),
+    }
@@ -0,0 +1,875 @@
+import gzip
+import io
+import json
+import tempfile
+import threading
+import time as time_module
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from importlib import import_module
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.apps import apps as django_apps
+from django.core import signing
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from authentication.models import CaregiverLink, User
+from authentication.serializers import RegisterSerializer
+
+from . import alerts, ics, purge, sms, summaries
+from .alerts import send_missed_dose_alerts
+from .audit import record_change
+from .consumers import device_token
+from .middleware import brotli
+from .models import (
+    Container,
+    Dispenser,
+    DispenserSummary,
+    IdempotencyRecord,
+    ManufacturedSerial,
+    MissedDoseAlert,
+    Schedule,
+    ScheduleAuditEntry,
+)
+from .notifications import container_payload, send_container_update
+from .routing import websocket_urlpatterns
+from .summaries import get_summary
+from .views import DeleteDispenserView
+
+IN_MEMORY_CHANNEL_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+def create_user(name='alice'):
+    return User.objects.create_user(
+        email=f'{name}@example.com', username=name, phoneNumber='5551234', password='password'
+    )
+
+
+def create_dispenser(owner, name='Kitchen', serial_id='S-20250101-0001'):
+    dispenser = Dispenser.objects.create(owner=owner, name=name, serial_id=serial_id, size=serial_id[0])
+    dispenser.initialize_containers()
+    return dispenser
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYER)
+class DispenserSocketTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.dispenser = create_dispenser(self.user)
+
+    def connect(self, path):
+        async def attempt():
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+            connected, code = await communicator.connect()
+            await communicator.disconnect()
+            return connected, code
+        return async_to_sync(attempt)()
+
+    def test_connect_without_token_is_rejected(self):
+        self.assertEqual(self.connect(f'/ws/dispensers/{self.dispenser.serial_id}/'), (False, 4403))
+
+    def test_connect_with_tampered_token_is_rejected(self):
+        token = device_token(self.dispenser) + 'x'
+        self.assertEqual(self.connect(f'/ws/dispensers/{self.dispenser.serial_id}/?token={token}'), (False, 4403))
+
+    def test_token_only_opens_its_own_serial(self):
+        other = create_dispenser(self.user, name='Bedroom', serial_id='S-20250101-0002')
+        path = f'/ws/dispensers/{self.dispenser.serial_id}/?token={device_token(other)}'
+        self.assertEqual(self.connect(path), (False, 4403))
+
+    def test_token_dies_with_the_dispenser(self):
+        token = device_token(self.dispenser)
+        self.dispenser.soft_delete()
+        create_dispenser(self.user, name='Kitchen again', serial_id=self.dispenser.serial_id)
+        self.assertEqual(self.connect(f'/ws/dispensers/{self.dispenser.serial_id}/?token={token}'), (False, 4403))
+
+    def test_device_receives_schedule_updates(self):
+        async def receive_update():
+            communicator = WebsocketCommunicator(
+                URLRouter(websocket_urlpatterns),
+                f'/ws/dispensers/{self.dispenser.serial_id}/?token={device_token(self.dispenser)}'
+            )
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await self.send_pill_name_update()
+            message = await communicator.receive_json_from(timeout=5)
+            await communicator.disconnect()
+            return message
+
+        message = async_to_sync(receive_update)()
+
+        self.assertEqual(message['type'], 'schedule.update')
+        self.assertEqual(message['container']['pill_name'], 'Aspirin')
+
+    async def send_pill_name_update(self):
+        container = await database_sync_to_async(self.dispenser.containers.get)(slot_number=1)
+        container.pill_name = 'Aspirin'
+        await database_sync_to_async(send_container_update)(
+            self.dispenser.serial_id, container_payload(container, [])
+        )
+
+    def test_register_returns_working_device_token(self):
+        ManufacturedSerial.objects.create(serial_id='M-20250101-0003')
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(
+            reverse('register-dispenser'), {'name': 'Office', 'serial_id': 'M-20250101-0003'}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 201)
+        path = f"/ws/dispensers/M-20250101-0003/?token={response.data['device_token']}"
+        self.assertEqual(self.connect(path)[0], True)
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.dispenser = create_dispenser(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.body = {'dispenser_name': self.dispenser.name, 'slot_number': 1, 'amount': 10}
+
+    def refill(self, key='refill-1', body=None):
+        return self.client.post(reverse('refill'), body or self.body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def pill_count(self):
+        return self.dispenser.containers.get(slot_number=1).pill_count
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.refill()
+        second = self.refill()
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(self.pill_count(), 10)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.refill()
+        response = self.refill(body={**self.body, 'amount': 5})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.pill_count(), 10)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=timedelta(milliseconds=200))
+    def test_duplicate_of_a_running_request_waits_then_conflicts(self):
+        self.refill()
+        IdempotencyRecord.objects.filter(key='refill-1').update(status_code=None, response_body=None)
+
+        response = self.refill()
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.pill_count(), 10)
+
+    def test_raised_exception_releases_the_key(self):
+        with mock.patch('dispenser_backend.views.RefillSerializer', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.refill()
+        self.assertFalse(IdempotencyRecord.objects.filter(key='refill-1').exists())
+
+        self.assertEqual(self.refill().status_code, 200)
+        self.assertEqual(self.pill_count(), 10)
+
+
+class PushFailureTests(TransactionTestCase):
+    def test_failed_push_does_not_fail_the_committed_edit(self):
+        user = create_user()
+        dispenser = create_dispenser(user)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with mock.patch('dispenser_backend.notifications.send_container_update', side_effect=ConnectionError), \
+                self.assertLogs('django.db.backends.base', 'ERROR'):
+            response = client.put(reverse('update-pill-name'), {
+                'dispenser_name': dispenser.name, 'slot_number': 1, 'pill_name': 'Aspirin'
+            }, format='json', HTTP_IDEMPOTENCY_KEY='rename-1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(dispenser.containers.get(slot_number=1).pill_name, 'Aspirin')
+        self.assertTrue(IdempotencyRecord.objects.filter(key='rename-1', status_code=200).exists())
+
+
+@override_settings(SMS_GATEWAY='dispenser_backend.sms.LocMemSMSGateway')
+class MissedDoseAlertTests(TestCase):
+    # Monday 09:00, so the sweep covers Monday 08:15-08:30
+    now = datetime(2025, 1, 6, 9, 0, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        sms.outbox.clear()
+        self.user = create_user()
+        container = create_dispenser(self.user).containers.get(slot_number=1)
+        container.pill_name = 'Aspirin'
+        container.save()
+        Schedule.objects.create(container=container, weekday=0, time=time(8, 20))
+
+    def test_missed_dose_is_texted_once(self):
+        self.assertEqual(send_missed_dose_alerts(self.now), 1)
+        self.assertEqual(send_missed_dose_alerts(self.now), 0)
+
+        self.assertEqual(len(sms.outbox), 1)
+        self.assertEqual(sms.outbox[0].to, '5551234')
+        self.assertIn('Aspirin (Kitchen) at 08:20', sms.outbox[0].body)
+
+    def test_dispensed_dose_is_not_texted(self):
+        Container.objects.update(last_dispensed_at=self.now - timedelta(minutes=40))
+        self.assertEqual(send_missed_dose_alerts(self.now), 0)
+        self.assertEqual(sms.outbox, [])
+
+    def test_overlapping_sweep_that_claimed_first_wins(self):
+        real_overdue_doses = alerts.overdue_doses
+
+        def claimed_meanwhile(start, end):
+            # Another sweep claims the user after this one read the claims
+            MissedDoseAlert.objects.create(user=self.user, window_start=start, dose_count=1)
+            return real_overdue_doses(start, end)
+
+        with mock.patch('dispenser_backend.alerts.overdue_doses', side_effect=claimed_meanwhile):
+            self.assertEqual(send_missed_dose_alerts(self.now), 0)
+        self.assertEqual(sms.outbox, [])
+
+    def test_failed_batch_is_retried_by_the_next_sweep(self):
+        with mock.patch.object(sms.LocMemSMSGateway, 'send_batch', side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                send_missed_dose_alerts(self.now)
+        self.assertFalse(MissedDoseAlert.objects.exists())
+
+        self.assertEqual(send_missed_dose_alerts(self.now), 1)
+        self.assertEqual(len(sms.outbox), 1)
+
+    def test_console_gateway_writes_to_its_stream(self):
+        stream = io.StringIO()
+        send_missed_dose_alerts(self.now, gateway=sms.ConsoleSMSGateway(stream=stream))
+        self.assertIn('SMS to 5551234: Missed doses: Aspirin', stream.getvalue())
+
+
+class ContainerQueryCountTests(TestCase):
+    """Every slot endpoint resolves the slot and its owner with one joined lookup"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.dispenser = create_dispenser(self.user)
+        get_summary(self.user.pk)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.detail_url = reverse(
+            'container-detail', kwargs={'dispenser_id': self.dispenser.pk, 'slot_number': 1}
+        )
+        self.slot = {'dispenser_name': self.dispenser.name, 'slot_number': 1}
+
+    def assertRequestQueries(self, expected, method, url, data=None):
+        """expected counts the view's own transaction statements too"""
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        sql = [query['sql'] for query in queries]
+        lookups = [
+            statement for statement in sql
+            if statement.startswith('SELECT') and 'INNER JOIN "dispenser_backend_dispenser"' in statement
+        ]
+        self.assertEqual(len(lookups), 1, "\n".join(sql))
+        self.assertEqual(len(sql), expected, "\n".join(sql))
+
+    def test_detail_get(self):
+        self.assertRequestQueries(2, 'get', self.detail_url)
+
+    def test_detail_put(self):
+        self.assertRequestQueries(13, 'put', self.detail_url, {
+            'pill_name': 'Aspirin', 'schedules': [{'weekday': 0, 'time': '08:00'}]
+        })
+
+    def test_detail_patch_pill_count(self):
+        self.assertRequestQueries(9, 'patch', self.detail_url, {'pill_count': 30})
+
+    def test_detail_patch_schedules(self):
+        self.assertRequestQueries(12, 'patch', self.detail_url, {'schedules': [{'weekday': 1, 'time': '08:00'}]})
+
+    def test_update_pill_name(self):
+        self.assertRequestQueries(8, 'put', reverse('update-pill-name'), {**self.slot, 'pill_name': 'Aspirin'})
+
+    def test_container_schedule(self):
+        self.assertRequestQueries(12, 'put', reverse('update-container-schedule'), {
+            **self.slot, 'schedules': [{'weekday': 2, 'time': '09:00'}]
+        })
+
+    def test_dispense(self):
+        Container.objects.filter(dispenser=self.dispenser).update(pill_count=10)
+        self.assertRequestQueries(8, 'post', reverse('dispense'), {**self.slot, 'count': 1})
+
+    def test_refill(self):
+        self.assertRequestQueries(8, 'post', reverse('refill'), {**self.slot, 'amount': 3})
+
+
+class DispenserSummaryTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def summary(self):
+        return self.client.get(reverse('dispenser-summary')).json()
+
+    def test_counters_follow_slot_changes(self):
+        dispenser = create_dispenser(self.user)
+        self.assertEqual(self.summary(), {'dispensers': 1, 'filled_slots': 0, 'doses_per_day': 0.0})
+
+        self.client.put(reverse('update-pill-name'), {
+            'dispenser_name': dispenser.name, 'slot_number': 1, 'pill_name': 'Aspirin'
+        }, format='json')
+        self.client.put(reverse('update-container-schedule'), {
+            'dispenser_name': dispenser.name, 'slot_number': 1,
+            'schedules': [{'weekday': weekday, 'time': '08:00'} for weekday in range(7)]
+        }, format='json')
+
+        self.assertEqual(self.summary(), {'dispensers': 1, 'filled_slots': 1, 'doses_per_day': 1.0})
+
+    def test_first_use_race_keeps_the_delta(self):
+        create_dispenser(self.user)
+        real_recount = summaries.recount
+
+        def created_meanwhile(owner_ids):
+            # A concurrent first use inserts the row from a recount that
+            # cannot see this transaction's new dispenser
+            DispenserSummary.objects.create(owner_id=self.user.pk, dispenser_count=0)
+            return real_recount(owner_ids)
+
+        with mock.patch('dispenser_backend.summaries.recount', side_effect=created_meanwhile):
+            summaries.adjust_summary(self.user.pk, dispenser_count=1)
+
+        self.assertEqual(DispenserSummary.objects.get(owner=self.user).dispenser_count, 1)
+
+    def test_concurrent_delete_subtracts_once(self):
+        dispenser = create_dispenser(self.user)
+        self.client.put(reverse('update-container-schedule'), {
+            'dispenser_name': dispenser.name, 'slot_number': 1, 'pill_name': 'Aspirin',
+            'schedules': [{'weekday': 0, 'time': '08:00'}]
+        }, format='json')
+        # Loaded by a second request before the first one deleted it
+        stale = Dispenser.objects.get(pk=dispenser.pk)
+
+        self.client.delete(reverse('delete-dispenser', args=[dispenser.name]))
+        DeleteDispenserView().perform_destroy(stale)
+
+        self.assertEqual(self.summary(), {'dispensers': 0, 'filled_slots': 0, 'doses_per_day': 0.0})
+
+    def reconcile(self, *args):
+        call_command('reconcile_dispenser_summaries', *args, stdout=io.StringIO())
+
+    def test_reconcile_fixes_drifted_summary(self):
+        create_dispenser(self.user)
+        get_summary(self.user.pk)
+        DispenserSummary.objects.filter(owner=self.user).update(dispenser_count=5, weekly_doses=3)
+
+        self.reconcile('--dry-run')
+        self.assertEqual(DispenserSummary.objects.get(owner=self.user).dispenser_count, 5)
+        self.reconcile()
+
+        summary = DispenserSummary.objects.get(owner=self.user)
+        self.assertEqual((summary.dispenser_count, summary.weekly_doses), (1, 0))
+
+    def test_reconcile_creates_missing_summary(self):
+        other = create_user('bob')
+        create_dispenser(self.user)
+        create_dispenser(other, serial_id='S-20250101-0002')
+        create_dispenser(other, name='Bedroom', serial_id='S-20250101-0003')
+        DispenserSummary.objects.all().delete()
+
+        self.reconcile('--batch-size', '1')
+
+        self.assertEqual(
+            dict(DispenserSummary.objects.values_list('owner_id', 'dispenser_count')),
+            {self.user.pk: 1, other.pk: 2}
+        )
+
+
+class ScheduleCalendarTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        container = create_dispenser(self.user).containers.get(slot_number=1)
+        container.pill_name = 'Aspirin'
+        container.save()
+        Schedule.objects.bulk_create([
+            Schedule(container=container, weekday=weekday, time=time(8, 0)) for weekday in range(7)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def feed_path(self, method='get'):
+        url = getattr(self.client, method)(reverse('schedule-calendar')).data['url']
+        return url.removeprefix('http://testserver')
+
+    def test_feed_is_served_without_credentials(self):
+        response = APIClient().get(self.feed_path())
+
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(body.count('BEGIN:VEVENT'), 7)
+        self.assertIn('SUMMARY:Aspirin', body)
+
+    def test_rotating_revokes_earlier_urls(self):
+        old_path = self.feed_path()
+        new_path = self.feed_path('post')
+
+        self.assertNotEqual(old_path, new_path)
+        self.assertEqual(APIClient().get(old_path).status_code, 404)
+        self.assertEqual(APIClient().get(new_path).status_code, 200)
+
+    def test_unkeyed_tokens_are_rejected(self):
+        legacy = signing.dumps(self.user.pk, salt=ics.FEED_TOKEN_SALT)
+        self.assertIsNone(ics.user_id_from_feed_token(legacy))
+
+    def test_async_iterator_matches_the_sync_one(self):
+        async def collect():
+            return "".join([piece async for piece in ics.aiter_calendar(self.user.pk)])
+
+        with mock.patch.object(ics, 'ASYNC_BATCH_SIZE', 3):
+            streamed = async_to_sync(collect)()
+        # DTSTAMP is the only line that depends on when it was generated
+        strip = lambda text: [line for line in text.splitlines() if not line.startswith('DTSTAMP')]
+        self.assertEqual(strip(streamed), strip("".join(ics.iter_calendar(self.user.pk))))
+
+
+class DoseLoadForecastTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.dispenser = create_dispenser(self.user)
+        other = create_dispenser(create_user('bob'), serial_id='S-20250101-0002')
+        Schedule.objects.bulk_create([
+            Schedule(container=self.dispenser.containers.get(slot_number=1), weekday=0, time=time(8, 0)),
+            Schedule(container=self.dispenser.containers.get(slot_number=2), weekday=0, time=time(8, 0)),
+            Schedule(container=self.dispenser.containers.get(slot_number=1), weekday=2, time=time(21, 30)),
+            Schedule(container=other.containers.get(slot_number=1), weekday=0, time=time(9, 0)),
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(
+            email='staff@example.com', username='staff', phoneNumber='5550000', is_staff=True
+        ))
+
+    def test_dispenser_report_covers_only_that_dispenser(self):
+        response = self.client.get(reverse('dose-load-forecast'), {'dispenser': self.dispenser.pk})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_doses'], 3)
+        self.assertEqual(response.data['busy_minutes'], [
+            {'weekday': 'Monday', 'time': '08:00', 'doses': 2},
+            {'weekday': 'Wednesday', 'time': '21:30', 'doses': 1},
+        ])
+        self.assertEqual(response.data['hourly_doses'][0][8], 2)
+
+    def test_unknown_dispenser_is_404(self):
+        for dispenser in ('9999', 'kitchen'):
+            response = self.client.get(reverse('dose-load-forecast'), {'dispenser': dispenser})
+            self.assertEqual(response.status_code, 404)
+
+
+class LowStockTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.container = create_dispenser(self.user).containers.get(slot_number=1)
+        Schedule.objects.create(container=self.container, weekday=0, time=time(8, 0))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_days_out_of_range_is_rejected(self):
+        for days in ('99999999', '-1', 'soon'):
+            response = self.client.get(reverse('low-stock'), {'days': days})
+            self.assertEqual(response.status_code, 400)
+
+    def test_backfill_marks_scheduled_containers_empty(self):
+        migration = import_module('dispenser_backend.migrations.0006_container_pill_inventory')
+        Container.objects.update(runs_out_at=None)
+
+        migration.backfill_runs_out_at(django_apps, None)
+
+        self.assertEqual(
+            list(Container.objects.filter(runs_out_at__isnull=False).values_list('pk', flat=True)),
+            [self.container.pk]
+        )
+        response = self.client.get(reverse('low-stock'))
+        self.assertEqual([item['slot_number'] for item in response.data], [1])
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def test_calendar_feed_token_is_not_stored(self):
+        user = create_user()
+        client = APIClient()
+        client.force_authenticate(user)
+        path = client.get(reverse('schedule-calendar')).data['url'].removeprefix('http://testserver')
+        token = path.rsplit('/', 1)[1].removesuffix('.ics')
+
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_DIRECTORY=directory):
+            response = APIClient().get(path)
+            b''.join(response.streaming_content)
+            captures = {item.name: item.read_text() for item in Path(directory).glob('*.json')}
+
+        self.assertEqual(len(captures), 1)
+        [(name, capture)] = captures.items()
+        self.assertNotIn(token, name + capture + response['X-Profile-Id'])
+        self.assertEqual(json.loads(capture)['path'], '/api/schedule-calendar/<token>.ics')
+
+
+class ScheduleTemplateTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.kitchen = create_dispenser(self.user)
+        self.bedroom = create_dispenser(self.user, name='Bedroom', serial_id='S-20250101-0002')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_template(self, entries):
+        return self.client.post(reverse('schedule-templates'), {'name': 'Mornings', 'entries': entries}, format='json')
+
+    def test_duplicate_entries_are_rejected(self):
+        response = self.create_template([{'weekday': 0, 'time': '08:00'}, {'weekday': 0, 'time': '08:00:00'}])
+        self.assertEqual(response.status_code, 400)
+
+    def test_only_the_exact_pairs_are_selected(self):
+        template_id = self.create_template([{'weekday': 0, 'time': '08:00'}]).data['id']
+        targets = [
+            {'dispenser_id': self.kitchen.pk, 'slot_number': 1},
+            {'dispenser_id': self.bedroom.pk, 'slot_number': 2},
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('apply-schedule-template', args=[template_id]), {'targets': targets}, format='json'
+            )
+
+        self.assertEqual(response.data['containers'], 2)
+        # The locking query must not pick up kitchen slot 2 or bedroom slot 1
+        # Every row the locking query reads gets locked on PostgreSQL; kitchen
+        # slot 2 and bedroom slot 1 must not be among them
+        [locking] = [query['sql'] for query in queries if query['sql'].startswith('SELECT "dispenser_backend_container"')]
+        with connection.cursor() as cursor:
+            cursor.execute(locking)
+            self.assertEqual(len(cursor.fetchall()), 2)
+        self.assertEqual(
+            set(Schedule.objects.values_list('container__dispenser', 'container__slot_number')),
+            {(self.kitchen.pk, 1), (self.bedroom.pk, 2)}
+        )
+
+
+class GenerateFixturesTests(TestCase):
+    def test_generated_users_pass_registration_rules(self):
+        call_command('generate_fixtures', users=3, stdout=io.StringIO())
+
+        users = User.objects.filter(username__startswith='fixture')
+        self.assertEqual(len(users), 3)
+        for user in users:
+            serializer = RegisterSerializer(data={
+                'email': f'copy-{user.email}', 'username': f'copy-{user.username}',
+                'phoneNumber': user.phoneNumber, 'password': 'long-enough-1', 'password2': 'long-enough-1',
+            })
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+
+
+class AuditTrailTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.dispenser = create_dispenser(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def rename(self, pill_name, slot_number=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.put(reverse('update-pill-name'), {
+                'dispenser_name': self.dispenser.name, 'slot_number': slot_number, 'pill_name': pill_name
+            }, format='json')
+
+    def history(self, **params):
+        return self.client.get(reverse('container-history', args=[self.dispenser.pk, 1]), params).data
+
+    def test_history_pages_newest_first(self):
+        for pill_name in ['A', 'B', 'C', 'D', 'E']:
+            self.rename(pill_name)
+
+        first = self.history(limit=2)
+        second = self.history(limit=2, before=first['next_before'])
+        last = self.history(limit=2, before=second['next_before'])
+
+        after = lambda page: [entry['after']['pill_name'] for entry in page['results']]
+        self.assertEqual([after(first), after(second), after(last)], [['E', 'D'], ['C', 'B'], ['A']])
+        self.assertIsNone(last['next_before'])
+        self.assertEqual(first['results'][0]['actor'], 'alice')
+
+    def test_rolled_back_change_leaves_no_entry(self):
+        container = self.dispenser.containers.get(slot_number=1)
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                record_change(container, self.user, ScheduleAuditEntry.PILL_NAME_UPDATE, {'pill_name': 'A'}, {'pill_name': 'B'})
+                raise RuntimeError
+
+        self.assertFalse(ScheduleAuditEntry.objects.exists())
+
+    def test_failed_insert_keeps_the_committed_change(self):
+        with mock.patch.object(ScheduleAuditEntry.objects, 'bulk_create', side_effect=DatabaseError), \
+                self.assertLogs('dispenser_backend.audit', 'ERROR'):
+            response = self.rename('Aspirin')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.dispenser.containers.get(slot_number=1).pill_name, 'Aspirin')
+
+    def test_template_apply_records_one_entry_per_container(self):
+        template_id = self.client.post(reverse('schedule-templates'), {
+            'name': 'Mornings', 'entries': [{'weekday': 0, 'time': '08:00'}, {'weekday': 1, 'time': '08:00'}]
+        }, format='json').data['id']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('apply-schedule-template', args=[template_id]), {'targets': [
+                {'dispenser_id': self.dispenser.pk, 'slot_number': slot_number} for slot_number in (1, 2, 3)
+            ]}, format='json')
+
+        entries = ScheduleAuditEntry.objects.order_by('slot_number')
+        self.assertEqual([entry.slot_number for entry in entries], [1, 2, 3])
+        self.assertEqual({entry.action for entry in entries}, {ScheduleAuditEntry.TEMPLATE_APPLY})
+        self.assertEqual(entries[0].after['schedules'], [[0, '08:00:00'], [1, '08:00:00']])
+
+
+class DispenserDeletionTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.dispenser = create_dispenser(self.user)
+        ManufacturedSerial.objects.create(serial_id=self.dispenser.serial_id)
+        Schedule.objects.bulk_create([
+            Schedule(container=container, weekday=weekday, time=time(8, 0))
+            for container in self.dispenser.containers.all() for weekday in range(7)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def delete(self):
+        return self.client.delete(reverse('delete-dispenser', args=[self.dispenser.name]))
+
+    def test_deleted_dispenser_is_hidden_immediately(self):
+        self.assertEqual(self.delete().status_code, 200)
+
+        self.assertEqual(self.client.get(reverse('list-all-user-dispensers')).data, [])
+        # Rows are only removed by the purge
+        self.assertTrue(Container.objects.filter(dispenser_id=self.dispenser.pk).exists())
+
+    def test_name_and_serial_can_be_registered_again(self):
+        self.delete()
+
+        response = self.client.post(reverse('register-dispenser'), {
+            'name': self.dispenser.name, 'serial_id': self.dispenser.serial_id
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Dispenser.objects.get().containers.count(), 4)
+
+    def test_purge_deletes_in_batches(self):
+        self.delete()
+
+        with CaptureQueriesContext(connection) as queries:
+            deleted = purge.purge_dispenser(self.dispenser.pk, batch_size=5)
+
+        # 28 schedules, 4 containers and the dispenser
+        self.assertEqual(deleted, 33)
+        # Five full batches and a last one of three, by primary key
+        schedule_deletes = [
+            query for query in queries
+            if query['sql'].startswith('DELETE FROM "dispenser_backend_schedule" WHERE "dispenser_backend_schedule"."id" IN')
+        ]
+        self.assertEqual(len(schedule_deletes), 6)
+        self.assertFalse(Schedule.objects.filter(container__dispenser_id=self.dispenser.pk).exists())
+        self.assertFalse(Container.objects.filter(dispenser_id=self.dispenser.pk).exists())
+        self.assertFalse(Dispenser.all_objects.filter(pk=self.dispenser.pk).exists())
+
+    def test_purge_does_not_touch_active_dispensers(self):
+        purge.purge_dispenser(self.dispenser.pk, batch_size=5)
+        self.assertTrue(Dispenser.objects.filter(pk=self.dispenser.pk).exists())
+
+    def test_background_purges_share_a_fixed_pool(self):
+        release = threading.Event()
+        purged = []
+
+        def slow_purge(dispenser_id):
+            release.wait(5)
+            purged.append(dispenser_id)
+
+        with mock.patch.object(purge, 'purge_dispenser', side_effect=slow_purge):
+            with self.captureOnCommitCallbacks(execute=True):
+                for dispenser_id in range(10):
+                    purge.purge_in_background(dispenser_id)
+            workers = [thread for thread in threading.enumerate() if thread.name.startswith('dispenser-purge-')]
+            release.set()
+            deadline = time_module.monotonic() + 5
+            while len(purged) < 10 and time_module.monotonic() < deadline:
+                time_module.sleep(0.01)
+
+        self.assertEqual(len(workers), purge.PURGE_WORKERS)
+        self.assertEqual(sorted(purged), list(range(10)))
+
+
+class CaregiverDashboardTests(TestCase):
+    def setUp(self):
+        self.caregiver = create_user('carol')
+        self.client = APIClient()
+        self.client.force_authenticate(self.caregiver)
+
+    def add_patient(self, number):
+        patient = create_user(f'patient{number}')
+        for index in range(2):
+            dispenser = create_dispenser(patient, name=f'Room {index}', serial_id=f'S-20250101-{number * 10 + index:04d}')
+            Schedule.objects.bulk_create([
+                Schedule(container=container, weekday=weekday, time=time(8, 0))
+                for container in dispenser.containers.all() for weekday in range(7)
+            ])
+        CaregiverLink.objects.create(caregiver=self.caregiver, patient=patient)
+        return patient
+
+    def dashboard(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('caregiver-dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_one_patient_takes_four_queries(self):
+        self.add_patient(1)
+
+        [patient] = self.dashboard()
+        self.assertEqual(patient['username'], 'patient1')
+        self.assertEqual(len(patient['dispensers']), 2)
+        self.assertEqual(len(patient['dispensers'][0]['containers']), 4)
+        self.assertIsNotNone(patient['dispensers'][0]['next_dose'])
+
+    def test_many_patients_take_the_same_four_queries(self):
+        for number in range(1, 6):
+            self.add_patient(number)
+        # Someone else's patient stays out of the dashboard
+        CaregiverLink.objects.create(caregiver=create_user('dave'), patient=self.add_patient(6))
+        CaregiverLink.objects.filter(caregiver=self.caregiver, patient__username='patient6').delete()
+
+        self.assertEqual(
+            [patient['username'] for patient in self.dashboard()],
+            ['patient1', 'patient2', 'patient3', 'patient4', 'patient5']
+        )
+
+
+class DispenserListPayloadTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        dispenser = create_dispenser(self.user)
+        Schedule.objects.create(container=dispenser.containers.get(slot_number=1), weekday=0, time=time(8, 0))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def dispensers(self, fields=None, **headers):
+        params = {'fields': fields} if fields else {}
+        return self.client.get(reverse('list-all-user-dispensers'), params, **headers)
+
+    def test_sparse_fieldsets(self):
+        [top] = self.dispensers('id,name').json()
+        self.assertEqual(set(top), {'id', 'name'})
+
+        [dotted] = self.dispensers('name,containers.slot_number,containers.schedules.time').json()
+        self.assertEqual(set(dotted), {'name', 'containers'})
+        self.assertEqual(set(dotted['containers'][0]), {'slot_number', 'schedules'})
+        self.assertEqual(dotted['containers'][0]['schedules'], [{'time': '08:00:00'}])
+
+        # A nested name without a dot keeps all of its fields
+        [bare] = self.dispensers('containers').json()
+        self.assertEqual(set(bare), {'containers'})
+        self.assertEqual(set(bare['containers'][0]), {'id', 'dispenser', 'slot_number', 'pill_name', 'pill_count', 'runs_out_at', 'schedules'})
+
+    def test_validation_errors_render_as_compact_json(self):
+        response = self.client.post(reverse('schedule-templates'), {'name': 'Empty', 'entries': []}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.content, json.dumps(response.json(), separators=(',', ':')).encode())
+        self.assertEqual(response.json(), {'entries': ['A template needs at least one schedule']})
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_brotli_when_accepted(self):
+        plain = self.dispensers()
+        response = self.dispensers(HTTP_ACCEPT_ENCODING='gzip, br')
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+    def test_gzip_when_brotli_is_refused_or_missing(self):
+        for accept_encoding in ('gzip', 'gzip, br;q=0'):
+            response = self.dispensers(HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn('Accept-Encoding', response['Vary'])
+            self.assertEqual(json.loads(gzip.decompress(response.content))[0]['name'], 'Kitchen')
+
+    def test_identity_when_nothing_is_accepted(self):
+        response = self.dispensers(HTTP_ACCEPT_ENCODING='br;q=0')
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.json()[0]['name'], 'Kitchen')
+
+
+class SerialInventoryTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def register(self, serial_id, name='Kitchen'):
+        return self.client.post(reverse('register-dispenser'), {'name': name, 'serial_id': serial_id}, format='json')
+
+    def test_unknown_serial_is_rejected(self):
+        response = self.register('S-20250101-0001')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['serial_id'], ['Unknown serial ID'])
+
+    def test_registered_serial_is_rejected(self):
+        ManufacturedSerial.objects.create(serial_id='S-20250101-0001')
+        self.assertEqual(self.register('S-20250101-0001').status_code, 201)
+
+        response = self.register('S-20250101-0001', name='Bedroom')
+
+        self.assertEqual(response.json()['serial_id'], ['This dispenser is already registered'])
+
+    def test_serial_of_a_deleted_dispenser_can_be_registered_again(self):
+        ManufacturedSerial.objects.create(serial_id='S-20250101-0001')
+        create_dispenser(self.user).soft_delete()
+
+        self.assertEqual(self.register('S-20250101-0001', name='Bedroom').status_code, 201)
+
+    def import_serials(self, text, batch_size):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as csv_file:
+            csv_file.write(text)
+            csv_file.flush()
+            stdout, stderr = io.StringIO(), io.StringIO()
+            call_command('import_serials', csv_file.name, batch_size=batch_size, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import_skips_header_counts_invalid_rows_and_dedupes(self):
+        ManufacturedSerial.objects.create(serial_id='S-20250101-0001')
+
+        stdout, stderr = self.import_serials(
+            "serial_id,note\n"
+            "S-20250101-0001,already known\n"
+            "M-20250101-0002\n"
+            "not-a-serial\n"
+            "\n"
+            "M-20250101-0002\n"
+            "L-20250101-0003\n"
+            "X-2025\n",
+            batch_size=2,
+        )
+
+        self.assertEqual(
+            sorted(ManufacturedSerial.objects.values_list('serial_id', flat=True)),
+            ['L-20250101-0003', 'M-20250101-0002', 'S-20250101-0001']
+        )
+        self.assertIn("(2 invalid rows skipped)", stdout)
+        self.assertEqual(stderr.count("invalid serial ID"), 2)
+        self.assertNotIn("serial_id", stderr)
@@ -18,19 +18,45 @@ from django.urls import path, include
 from .views import (
     UpdateContainerSchedule,
     RegisterDispenserView,
+    DeviceTokenView,
     UpdatePillNameView,
     UpdateDispenserNameView,
     DeleteDispenserView,
-    ShowAllDispensers
+    ShowAllDispensers,
+    DispenserSummaryView,
+    ScheduleCalendarLinkView,
+    ScheduleCalendarFeedView,
+    DoseLoadForecastView,
+    CaregiverDashboardView,
+    DispenseView,
+    RefillView,
+    LowStockView,
+    ContainerDetailView,
+    ContainerHistoryView,
+    ScheduleTemplatesView,
+    ApplyScheduleTemplateView
 )
 
 
 urlpatterns = [
     path('api/container-schedule/', UpdateContainerSchedule.as_view(), name='update-container-schedule'),
     path('api/register-dispenser/', RegisterDispenserView.as_view(), name='register-dispenser'),
+    path('api/dispensers/<int:dispenser_id>/device-token/', DeviceTokenView.as_view(), name='device-token'),
     path('api/update-pill-name/', UpdatePillNameView.as_view(), name='update-pill-name'),
     path('api/update-dispenser-name/', UpdateDispenserNameView.as_view(), name='update-dispenser-name'),
     path('api/delete-dispenser/<str:name>/', DeleteDispenserView.as_view(), name='delete-dispenser'),
     path('api/list-all-user-dispensers/', ShowAllDispensers.as_view(), name='list-all-user-dispensers'),
+    path('api/dispenser-summary/', DispenserSummaryView.as_view(), name='dispenser-summary'),
+    path('api/schedule-calendar/', ScheduleCalendarLinkView.as_view(), name='schedule-calendar'),
+    path('api/schedule-calendar/<str:token>.ics', ScheduleCalendarFeedView.as_view(), name='schedule-calendar-feed'),
+    path('api/staff/dose-load-forecast/', DoseLoadForecastView.as_view(), name='dose-load-forecast'),
+    path('api/caregiver-dashboard/', CaregiverDashboardView.as_view(), name='caregiver-dashboard'),
+    path('api/dispense/', DispenseView.as_view(), name='dispense'),
+    path('api/refill/', RefillView.as_view(), name='refill'),
+    path('api/low-stock/', LowStockView.as_view(), name='low-stock'),
+    path('api/dispensers/<int:dispenser_id>/containers/<int:slot_number>/', ContainerDetailView.as_view(), name='container-detail'),
+    path('api/dispensers/<int:dispenser_id>/containers/<int:slot_number>/history/', ContainerHistoryView.as_view(), name='container-history'),
+    path('api/schedule-templates/', ScheduleTemplatesView.as_view(), name='schedule-templates'),
+    path('api/schedule-templates/<int:template_id>/apply/', ApplyScheduleTemplateView.as_view(), name='apply-schedule-template'),
     path('authentication/', include('authentication.urls')),
 ]
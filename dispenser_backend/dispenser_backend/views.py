@@ -1,8 +1,30 @@
+import operator
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+
 from rest_framework import generics, status, permissions
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
-from .models import Dispenser, Container, Schedule
+from django.db.models import F, Prefetch, Q
+from django.http import HttpResponseNotModified, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import parse_etags
+from .audit import container_state, record_change
+from .consumers import device_token
+from .forecast import dispenser_report, forecast_report
+from .idempotency import IdempotentMixin
+from .ics import aiter_calendar, feed_token, iter_calendar, rotate_feed_token, schedule_etag, user_id_from_feed_token
+from .models import Dispenser, Container, Schedule, ScheduleAuditEntry, ScheduleTemplate
+from .notifications import notify_container_changed
+from .purge import purge_in_background
+from .schedule_templates import apply_schedule_template
+from .summaries import adjust_summary, filled_containers, get_summary, slot_change_deltas
 from .serializers import (
     DispenserSerializer,
     ContainerSerializer,
@@ -10,10 +32,38 @@ from .serializers import (
     RegisterDispenserSerializer,
     ContainerScheduleUpdateSerializer,
     UpdatePillNameSerializer,
-    UpdateDispenserNameSerializer
+    UpdateDispenserNameSerializer,
+    CaregiverPatientSerializer,
+    DispenseSerializer,
+    RefillSerializer,
+    LowStockContainerSerializer,
+    ContainerUpdateSerializer,
+    ScheduleTemplateSerializer,
+    ApplyScheduleTemplateSerializer,
+    ScheduleAuditEntrySerializer
 )
 
-class RegisterDispenserView(generics.CreateAPIView):
+def owned_containers(user, for_update=False):
+    """
+    The user's containers joined with their dispenser.
+    for_update locks the container rows until the transaction ends.
+    """
+    queryset = Container.objects.select_related('dispenser').filter(
+        dispenser__owner=user,
+        dispenser__deleted_at__isnull=True
+    )
+    if for_update:
+        queryset = queryset.select_for_update(of=('self',))
+    return queryset
+
+def get_owned_container(user, dispenser_name, slot_number, for_update=False):
+    """One joined query; raises Container.DoesNotExist"""
+    return owned_containers(user, for_update).get(
+        dispenser__name=dispenser_name,
+        slot_number=slot_number
+    )
+
+class RegisterDispenserView(IdempotentMixin, generics.CreateAPIView):
     serializer_class = RegisterDispenserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -35,37 +85,46 @@ class RegisterDispenserView(generics.CreateAPIView):
 
         # Initialize containers and schedules
         dispenser.initialize_containers()
+        adjust_summary(request.user.pk, dispenser_count=1)
 
-        # Return the created dispenser with all its containers and schedules
+        # Return the created dispenser with all its containers and schedules,
+        # and the token the device needs for its push socket
         response_serializer = DispenserSerializer(dispenser)
-        return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+        return Response(
+            {**response_serializer.data, "device_token": device_token(dispenser)},
+            status=status.HTTP_201_CREATED
+        )
 
-class UpdateContainerSchedule(generics.UpdateAPIView):
-    serializer_class = ContainerScheduleUpdateSerializer
+class DeviceTokenView(APIView):
+    """The push socket token of one of the user's dispensers, to provision the device again"""
     permission_classes = [permissions.IsAuthenticated]
 
-    @transaction.atomic
-    def update(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-
-        # Get the dispenser and verify ownership
+    def get(self, request, dispenser_id):
         try:
-            dispenser = Dispenser.objects.get(
-                owner=request.user,
-                name=serializer.validated_data['dispenser_name']
-            )
+            dispenser = Dispenser.objects.get(owner=request.user, pk=dispenser_id)
         except Dispenser.DoesNotExist:
             return Response(
                 {"detail": "Dispenser not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
+        return Response({"device_token": device_token(dispenser)}, status=status.HTTP_200_OK)
+
+class UpdateContainerSchedule(IdempotentMixin, generics.UpdateAPIView):
+    serializer_class = ContainerScheduleUpdateSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-        # Get the container
+        # Get the container and verify ownership in one query
         try:
-            container = Container.objects.get(
-                dispenser=dispenser,
-                slot_number=serializer.validated_data['slot_number']
+            container = get_owned_container(
+                request.user,
+                serializer.validated_data['dispenser_name'],
+                serializer.validated_data['slot_number'],
+                for_update=True
             )
         except Container.DoesNotExist:
             return Response(
@@ -73,28 +132,29 @@ class UpdateContainerSchedule(generics.UpdateAPIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        before = container_state(container, container.schedules.all())
+
         # Update container pill name
-        container.pill_name = serializer.validated_data['pill_name']
-        container.save()
+        if 'pill_name' in serializer.validated_data:
+            container.pill_name = serializer.validated_data['pill_name']
+            container.save(update_fields=['pill_name'])
 
-        # Delete existing schedules
-        container.schedules.all().delete()
+        container.replace_schedules(serializer.validated_data['schedules'])
+        container.update_depletion_forecast()
+        schedules = list(container.schedules.all())
 
-        # Create new schedules
-        new_schedules = []
-        for schedule_data in serializer.validated_data['schedules']:
-            schedule = Schedule.objects.create(
-                container=container,
-                weekday=schedule_data['weekday'],
-                time=schedule_data['time'],
-            )
-            new_schedules.append(schedule)
+        after = container_state(container, schedules)
+        record_change(container, request.user, ScheduleAuditEntry.SCHEDULE_UPDATE, before, after)
+        adjust_summary(request.user.pk, **slot_change_deltas(container.slot_number, before, after))
+        # Let the dispenser reprogram the slot once this commits
+        notify_container_changed(container, schedules)
+        container.dispenser.bump_schedule_version()
 
         # Return the updated container with its new schedules
         response_serializer = ContainerSerializer(container)
         return Response(response_serializer.data)
 
-class DispenserView(APIView):
+class DispenserView(IdempotentMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
@@ -103,29 +163,22 @@ class DispenserView(APIView):
         ser.save()
         return Response(ser.data, status=status.HTTP_201_CREATED)
 
-class UpdatePillNameView(generics.UpdateAPIView):
+class UpdatePillNameView(IdempotentMixin, generics.UpdateAPIView):
     serializer_class = UpdatePillNameSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @transaction.atomic
     def update(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
+        # Locked so concurrent renames see each other's name as "before"
         try:
-            dispenser = Dispenser.objects.get(
-                owner=request.user,
-                name=serializer.validated_data['dispenser_name']
-            )
-        except Dispenser.DoesNotExist:
-            return Response(
-                {"detail": "Dispenser not found"},
-                status=status.HTTP_404_NOT_FOUND
-            )
-
-        try:
-            container = Container.objects.get(
-                dispenser=dispenser,
-                slot_number=serializer.validated_data['slot_number']
+            container = get_owned_container(
+                request.user,
+                serializer.validated_data['dispenser_name'],
+                serializer.validated_data['slot_number'],
+                for_update=True
             )
         except Container.DoesNotExist:
             return Response(
@@ -133,13 +186,22 @@ class UpdatePillNameView(generics.UpdateAPIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        schedules = list(container.schedules.all())
+        before = container_state(container, schedules)
+
         container.pill_name = serializer.validated_data['pill_name']
-        container.save()
+        container.save(update_fields=['pill_name'])
+
+        after = container_state(container, schedules)
+        record_change(container, request.user, ScheduleAuditEntry.PILL_NAME_UPDATE, before, after)
+        adjust_summary(request.user.pk, **slot_change_deltas(container.slot_number, before, after))
+        notify_container_changed(container, schedules)
+        container.dispenser.bump_schedule_version()
 
         response_serializer = ContainerSerializer(container)
         return Response(response_serializer.data)
 
-class UpdateDispenserNameView(generics.UpdateAPIView):
+class UpdateDispenserNameView(IdempotentMixin, generics.UpdateAPIView):
     serializer_class = UpdateDispenserNameSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -160,11 +222,12 @@ class UpdateDispenserNameView(generics.UpdateAPIView):
 
         dispenser.name = serializer.validated_data['new_name']
         dispenser.save()
+        dispenser.bump_schedule_version()
 
         response_serializer = DispenserSerializer(dispenser)
         return Response(response_serializer.data)
 
-class DeleteDispenserView(generics.DestroyAPIView):
+class DeleteDispenserView(IdempotentMixin, generics.DestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     lookup_field = 'name'
     queryset = Dispenser.objects.all()
@@ -172,6 +235,24 @@ class DeleteDispenserView(generics.DestroyAPIView):
     def get_queryset(self):
         return Dispenser.objects.filter(owner=self.request.user)
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        # Take what it contributed off the owner's summary
+        filled_slots = filled_containers().filter(dispenser=instance).count()
+        weekly_doses = Schedule.objects.filter(container__dispenser=instance).count()
+
+        # Hide it now, dependent rows are removed in bounded batches later.
+        # Only the request that actually deleted it adjusts the summary
+        if not instance.soft_delete():
+            return
+        adjust_summary(
+            instance.owner_id,
+            dispenser_count=-1,
+            filled_slots=-filled_slots,
+            weekly_doses=-weekly_doses
+        )
+        purge_in_background(instance.pk)
+
     def destroy(self, request, *args, **kwargs):
         try:
             instance = self.get_object()
@@ -190,6 +271,375 @@ class ShowAllDispensers(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        queryset = Dispenser.objects.filter(owner=request.user)
-        serializer = DispenserSerializer(queryset, many=True)
+        queryset = Dispenser.objects.filter(owner=request.user).select_related(
+            'owner'
+        ).prefetch_related('containers__schedules')
+        # The request in context enables ?fields= sparse fieldsets
+        serializer = DispenserSerializer(queryset, many=True, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+class DispenserSummaryView(APIView):
+    """Header counters: dispensers, filled slots and doses per day"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        summary = get_summary(request.user.pk)
+        return Response({
+            "dispensers": summary.dispenser_count,
+            "filled_slots": summary.filled_slots,
+            "doses_per_day": summary.doses_per_day,
+        }, status=status.HTTP_200_OK)
+
+class ScheduleCalendarLinkView(APIView):
+    """
+    GET returns the private URL a calendar app can subscribe to, POST
+    revokes every earlier URL and returns a new one.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return self.link_response(request, feed_token(request.user))
+
+    def post(self, request):
+        return self.link_response(request, rotate_feed_token(request.user))
+
+    def link_response(self, request, token):
+        path = reverse('schedule-calendar-feed', kwargs={'token': token})
+        return Response({"url": request.build_absolute_uri(path)}, status=status.HTTP_200_OK)
+
+class ScheduleCalendarFeedView(APIView):
+    """
+    The user's dose schedules as an iCalendar feed.
+    Calendar apps cannot send a bearer token, so the signed token in the URL
+    identifies the user instead.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, token):
+        user_id = user_id_from_feed_token(token)
+        if user_id is None:
+            return Response(
+                {"detail": "Calendar not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        etag = schedule_etag(user_id)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            # Each server type gets the iterator it can stream without buffering
+            if isinstance(request._request, ASGIRequest):
+                content = aiter_calendar(user_id)
+            else:
+                content = iter_calendar(user_id)
+            response = StreamingHttpResponse(content, content_type='text/calendar; charset=utf-8')
+            response['Content-Disposition'] = 'inline; filename="pill-schedule.ics"'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+class DoseLoadForecastView(APIView):
+    """
+    Fleet-wide doses per minute of the week, for capacity planning.
+    ?dispenser=<id> reports the week of that one dispenser instead.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        dispenser_id = request.query_params.get('dispenser')
+        if dispenser_id is None:
+            return Response(forecast_report(), status=status.HTTP_200_OK)
+
+        try:
+            dispenser = Dispenser.objects.get(pk=int(dispenser_id))
+        except (ValueError, Dispenser.DoesNotExist):
+            return Response(
+                {"detail": "Dispenser not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(dispenser_report(dispenser.pk), status=status.HTTP_200_OK)
+
+class CaregiverDashboardView(APIView):
+    """
+    Every linked patient's dispensers, slots and next dose times.
+    Uses four queries (patients, dispensers, containers, schedules) no
+    matter how many patients the caregiver has.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        patients = get_user_model().objects.filter(
+            caregiver_links__caregiver=request.user
+        ).order_by('username').only('id', 'username', 'email').prefetch_related(
+            Prefetch(
+                'dispensers',
+                queryset=Dispenser.objects.only('id', 'name', 'size', 'owner_id').prefetch_related(
+                    Prefetch(
+                        'containers',
+                        queryset=Container.objects.only(
+                            'id', 'slot_number', 'pill_name', 'dispenser_id'
+                        ).prefetch_related(
+                            Prefetch('schedules', queryset=Schedule.objects.only('weekday', 'time', 'container_id'))
+                        )
+                    )
+                )
+            )
+        )
+        serializer = CaregiverPatientSerializer(
+            patients, many=True, context={'now': timezone.localtime()}
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+class DispenseView(IdempotentMixin, APIView):
+    """Called when pills drop; takes them off the container's stock"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @transaction.atomic
+    def post(self, request):
+        serializer = DispenseSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            container = get_owned_container(
+                request.user,
+                serializer.validated_data['dispenser_name'],
+                serializer.validated_data['slot_number']
+            )
+        except Container.DoesNotExist:
+            return Response(
+                {"detail": "Container not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        # Atomic in the database, concurrent dispenses cannot lose updates
+        count = serializer.validated_data['count']
+        updated = Container.objects.filter(
+            pk=container.pk,
+            pill_count__gte=count
+        ).update(pill_count=F('pill_count') - count, last_dispensed_at=timezone.now())
+        if not updated:
+            return Response(
+                {"detail": "Not enough pills left in this container"},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        container.refresh_from_db(fields=['pill_count', 'last_dispensed_at'])
+        container.update_depletion_forecast()
+
+        return Response(ContainerSerializer(container).data, status=status.HTTP_200_OK)
+
+class RefillView(IdempotentMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @transaction.atomic
+    def post(self, request):
+        serializer = RefillSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            container = get_owned_container(
+                request.user,
+                serializer.validated_data['dispenser_name'],
+                serializer.validated_data['slot_number']
+            )
+        except Container.DoesNotExist:
+            return Response(
+                {"detail": "Container not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        Container.objects.filter(pk=container.pk).update(
+            pill_count=F('pill_count') + serializer.validated_data['amount']
+        )
+        container.refresh_from_db(fields=['pill_count'])
+        container.update_depletion_forecast()
+
+        return Response(ContainerSerializer(container).data, status=status.HTTP_200_OK)
+
+class LowStockView(APIView):
+    """Containers across all the user's dispensers that run out within ?days= (default 3)"""
+    permission_classes = [permissions.IsAuthenticated]
+    # Far enough to list every container that runs out at all, near enough
+    # that now + days stays a valid datetime
+    MAX_DAYS = 36500
+
+    def get(self, request):
+        try:
+            days = int(request.query_params.get('days', 3))
+        except ValueError:
+            days = None
+        if days is None or not 0 <= days <= self.MAX_DAYS:
+            return Response(
+                {"detail": f"days must be a whole number from 0 to {self.MAX_DAYS}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        containers = Container.objects.filter(
+            dispenser__owner=request.user,
+            dispenser__deleted_at__isnull=True,
+            runs_out_at__lte=timezone.now() + timedelta(days=days)
+        ).select_related('dispenser').order_by('runs_out_at')
+        serializer = LowStockContainerSerializer(containers, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+class ContainerDetailView(IdempotentMixin, generics.RetrieveUpdateAPIView):
+    """
+    /api/dispensers/<dispenser_id>/containers/<slot_number>/
+    GET the slot, PUT to replace pill name and schedules, PATCH to change
+    any of pill_name, pill_count and schedules.
+    """
+    serializer_class = ContainerUpdateSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_object(self):
+        # Lock the row for writes so concurrent edits of a slot serialize
+        queryset = owned_containers(
+            self.request.user,
+            for_update=self.request.method not in permissions.SAFE_METHODS
+        )
+        try:
+            return queryset.get(
+                dispenser_id=self.kwargs['dispenser_id'],
+                slot_number=self.kwargs['slot_number']
+            )
+        except Container.DoesNotExist:
+            raise NotFound("Container not found")
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(ContainerSerializer(self.get_object()).data)
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data, partial=kwargs.pop('partial', False))
+        serializer.is_valid(raise_exception=True)
+        container = self.get_object()
+        data = serializer.validated_data
+        schedules = list(container.schedules.all())
+        before = container_state(container, schedules)
+
+        update_fields = [field for field in ('pill_name', 'pill_count') if field in data]
+        for field in update_fields:
+            setattr(container, field, data[field])
+        if update_fields:
+            container.save(update_fields=update_fields)
+
+        if 'schedules' in data:
+            container.replace_schedules(data['schedules'])
+        if 'schedules' in data or 'pill_count' in data:
+            container.update_depletion_forecast()
+        if 'schedules' in data:
+            schedules = list(container.schedules.all())
+
+        after = container_state(container, schedules)
+        record_change(container, request.user, ScheduleAuditEntry.CONTAINER_UPDATE, before, after)
+        adjust_summary(request.user.pk, **slot_change_deltas(container.slot_number, before, after))
+        notify_container_changed(container, schedules)
+        container.dispenser.bump_schedule_version()
+
+        return Response(ContainerSerializer(container).data)
+
+class ContainerHistoryView(APIView):
+    """
+    A slot's audit trail, newest first. ?limit= (default 50, at most 200)
+    entries per page; pass the returned next_before as ?before= for the
+    next page.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, dispenser_id, slot_number):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 50)), 200))
+            before = request.query_params.get('before')
+            before = int(before) if before is not None else None
+        except ValueError:
+            return Response(
+                {"detail": "limit and before must be whole numbers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            container_id = owned_containers(request.user).values_list('id', flat=True).get(
+                dispenser_id=dispenser_id,
+                slot_number=slot_number
+            )
+        except Container.DoesNotExist:
+            return Response(
+                {"detail": "Container not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        entries = ScheduleAuditEntry.objects.filter(container_id=container_id)
+        if before is not None:
+            entries = entries.filter(id__lt=before)
+        entries = list(entries.select_related('actor').order_by('-id')[:limit])
+
+        return Response({
+            "results": ScheduleAuditEntrySerializer(entries, many=True).data,
+            "next_before": entries[-1].id if len(entries) == limit else None,
+        }, status=status.HTTP_200_OK)
+
+class ScheduleTemplatesView(IdempotentMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        templates = ScheduleTemplate.objects.filter(owner=request.user).prefetch_related('entries')
+        serializer = ScheduleTemplateSerializer(templates, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @transaction.atomic
+    def post(self, request):
+        serializer = ScheduleTemplateSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+class ApplyScheduleTemplateView(IdempotentMixin, APIView):
+    """
+    Replace the schedules of many (dispenser_id, slot_number) targets with
+    a template's, in one transaction.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @transaction.atomic
+    def post(self, request, template_id):
+        try:
+            template = ScheduleTemplate.objects.get(owner=request.user, pk=template_id)
+        except ScheduleTemplate.DoesNotExist:
+            return Response(
+                {"detail": "Template not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        serializer = ApplyScheduleTemplateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        targets = {
+            (target['dispenser_id'], target['slot_number'])
+            for target in serializer.validated_data['targets']
+        }
+
+        # One locked query for all targets that matches the exact pairs, so
+        # no other slot of the same dispensers gets locked
+        slots_by_dispenser = defaultdict(set)
+        for dispenser_id, slot_number in targets:
+            slots_by_dispenser[dispenser_id].add(slot_number)
+        containers = list(owned_containers(request.user, for_update=True).filter(reduce(operator.or_, (
+            Q(dispenser_id=dispenser_id, slot_number__in=slot_numbers)
+            for dispenser_id, slot_numbers in slots_by_dispenser.items()
+        ))))
+
+        missing = targets - {(container.dispenser_id, container.slot_number) for container in containers}
+        if missing:
+            return Response({
+                "detail": "Container not found",
+                "missing": [
+                    {"dispenser_id": dispenser_id, "slot_number": slot_number}
+                    for dispenser_id, slot_number in sorted(missing)
+                ]
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        written = apply_schedule_template(template, containers, actor=request.user)
+        return Response(
+            {"containers": len(containers), "schedules": written},
+            status=status.HTTP_200_OK
+        )